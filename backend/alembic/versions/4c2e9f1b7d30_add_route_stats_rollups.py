@@ -0,0 +1,60 @@
+"""add route stats rollups
+
+Revision ID: 4c2e9f1b7d30
+Revises: 1a69553c158b
+Create Date: 2026-10-19 10:12:05.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c2e9f1b7d30'
+down_revision: Union[str, Sequence[str], None] = '1a69553c158b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('route_stats_daily',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('route_count', sa.Integer(), nullable=False),
+    sa.Column('total_km', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+    op.create_table('route_stats_destination',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('destination', sa.String(length=200), nullable=False),
+    sa.Column('route_count', sa.Integer(), nullable=False),
+    sa.Column('total_km', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'destination')
+    )
+
+    # Backfill rollups from existing history
+    op.execute("""
+        INSERT INTO route_stats_daily (user_id, day, route_count, total_km)
+        SELECT user_id, CAST(COALESCE(created_at, CURRENT_TIMESTAMP) AS DATE),
+               COUNT(*), COALESCE(SUM(kilometer_distance), 0)
+        FROM route_history
+        GROUP BY user_id, CAST(COALESCE(created_at, CURRENT_TIMESTAMP) AS DATE)
+    """)
+    op.execute("""
+        INSERT INTO route_stats_destination (user_id, destination, route_count, total_km)
+        SELECT user_id, destination, COUNT(*),
+               COALESCE(SUM(kilometer_distance), 0)
+        FROM route_history
+        GROUP BY user_id, destination
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('route_stats_destination')
+    op.drop_table('route_stats_daily')
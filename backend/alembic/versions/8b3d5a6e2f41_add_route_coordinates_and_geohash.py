@@ -0,0 +1,50 @@
+"""add route coordinates and geohash
+
+Revision ID: 8b3d5a6e2f41
+Revises: 4c2e9f1b7d30
+Create Date: 2026-10-19 11:40:52.604917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b3d5a6e2f41'
+down_revision: Union[str, Sequence[str], None] = '4c2e9f1b7d30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('route_history', sa.Column('source_lat', sa.Float(), nullable=True))
+    op.add_column('route_history', sa.Column('source_lon', sa.Float(), nullable=True))
+    op.add_column('route_history', sa.Column('destination_lat', sa.Float(), nullable=True))
+    op.add_column('route_history', sa.Column('destination_lon', sa.Float(), nullable=True))
+    op.add_column('route_history', sa.Column('source_geohash', sa.String(length=12), nullable=True))
+    op.add_column('route_history', sa.Column('destination_geohash', sa.String(length=12), nullable=True))
+    op.create_index(
+        'ix_route_history_user_source_geohash', 'route_history',
+        ['user_id', 'source_geohash'], unique=False,
+        postgresql_ops={'source_geohash': 'varchar_pattern_ops'}
+    )
+    op.create_index(
+        'ix_route_history_user_destination_geohash', 'route_history',
+        ['user_id', 'destination_geohash'], unique=False,
+        postgresql_ops={'destination_geohash': 'varchar_pattern_ops'}
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_route_history_user_destination_geohash', table_name='route_history')
+    op.drop_index('ix_route_history_user_source_geohash', table_name='route_history')
+    op.drop_column('route_history', 'destination_geohash')
+    op.drop_column('route_history', 'source_geohash')
+    op.drop_column('route_history', 'destination_lon')
+    op.drop_column('route_history', 'destination_lat')
+    op.drop_column('route_history', 'source_lon')
+    op.drop_column('route_history', 'source_lat')
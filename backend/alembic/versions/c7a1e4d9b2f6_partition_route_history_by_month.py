@@ -0,0 +1,174 @@
+"""partition route history by month
+
+Revision ID: c7a1e4d9b2f6
+Revises: 8b3d5a6e2f41
+Create Date: 2026-10-19 15:03:27.731540
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7a1e4d9b2f6'
+down_revision: Union[str, Sequence[str], None] = '8b3d5a6e2f41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = (
+    "id, source, destination, mile_distance, kilometer_distance, user_id, "
+    "created_at, source_lat, source_lon, destination_lat, destination_lon, "
+    "source_geohash, destination_geohash"
+)
+LEGACY_INDEXES = (
+    'ix_route_history_id',
+    'ix_route_history_user_source_geohash',
+    'ix_route_history_user_destination_geohash',
+)
+
+
+def _create_indexes() -> None:
+    op.create_index(op.f('ix_route_history_id'), 'route_history', ['id'], unique=False)
+    op.create_index(
+        'ix_route_history_user_created_at', 'route_history',
+        ['user_id', 'created_at'], unique=False
+    )
+    op.create_index(
+        'ix_route_history_user_source_geohash', 'route_history',
+        ['user_id', 'source_geohash'], unique=False,
+        postgresql_ops={'source_geohash': 'varchar_pattern_ops'}
+    )
+    op.create_index(
+        'ix_route_history_user_destination_geohash', 'route_history',
+        ['user_id', 'destination_geohash'], unique=False,
+        postgresql_ops={'destination_geohash': 'varchar_pattern_ops'}
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('route_history_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('partition_name', sa.String(length=100), nullable=False),
+    sa.Column('range_start', sa.DateTime(), nullable=False),
+    sa.Column('range_end', sa.DateTime(), nullable=False),
+    sa.Column('path', sa.String(length=500), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('partition_name')
+    )
+    op.create_index(op.f('ix_route_history_archive_id'), 'route_history_archive', ['id'], unique=False)
+
+    # Move the existing table aside; its indexes are dropped so the names
+    # can be reused on the partitioned parent.
+    op.execute("ALTER TABLE route_history RENAME TO route_history_legacy")
+    op.execute(
+        "ALTER TABLE route_history_legacy "
+        "RENAME CONSTRAINT route_history_pkey TO route_history_legacy_pkey"
+    )
+    for name in LEGACY_INDEXES:
+        op.drop_index(name, table_name='route_history_legacy')
+
+    # Partition key must be part of the primary key and non-null.
+    op.execute("""
+        CREATE TABLE route_history (
+            id INTEGER NOT NULL DEFAULT nextval('route_history_id_seq'::regclass),
+            source VARCHAR(200) NOT NULL,
+            destination VARCHAR(200) NOT NULL,
+            mile_distance FLOAT,
+            kilometer_distance FLOAT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            created_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            source_lat FLOAT,
+            source_lon FLOAT,
+            destination_lat FLOAT,
+            destination_lon FLOAT,
+            source_geohash VARCHAR(12),
+            destination_geohash VARCHAR(12),
+            CONSTRAINT route_history_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("CREATE TABLE route_history_default PARTITION OF route_history DEFAULT")
+
+    # One partition per month from the oldest row through three months ahead;
+    # later months are created by `python -m app.retention`.
+    op.execute("""
+        DO $$
+        DECLARE
+            month_start TIMESTAMP := date_trunc(
+                'month',
+                COALESCE(
+                    (SELECT min(created_at) FROM route_history_legacy),
+                    now() AT TIME ZONE 'utc'
+                )
+            );
+            last_month TIMESTAMP := date_trunc('month', now() AT TIME ZONE 'utc')
+                                    + interval '3 months';
+        BEGIN
+            WHILE month_start <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF route_history FOR VALUES FROM (%L) TO (%L)',
+                    'route_history_' || to_char(month_start, '"y"YYYY"m"MM'),
+                    month_start,
+                    month_start + interval '1 month'
+                );
+                month_start := month_start + interval '1 month';
+            END LOOP;
+        END $$;
+    """)
+
+    op.execute(f"""
+        INSERT INTO route_history ({COLUMNS})
+        SELECT {COLUMNS.replace("created_at", "COALESCE(created_at, now() AT TIME ZONE 'utc')")}
+        FROM route_history_legacy
+    """)
+    op.execute("ALTER SEQUENCE route_history_id_seq OWNED BY route_history.id")
+    op.execute("DROP TABLE route_history_legacy")
+
+    _create_indexes()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Archived (detached and dropped) partitions are not restored.
+    op.execute("ALTER TABLE route_history RENAME TO route_history_partitioned")
+    op.execute(
+        "ALTER TABLE route_history_partitioned "
+        "RENAME CONSTRAINT route_history_pkey TO route_history_partitioned_pkey"
+    )
+    for name in LEGACY_INDEXES + ('ix_route_history_user_created_at',):
+        op.drop_index(name, table_name='route_history_partitioned')
+
+    op.execute("""
+        CREATE TABLE route_history (
+            id INTEGER NOT NULL DEFAULT nextval('route_history_id_seq'::regclass),
+            source VARCHAR(200) NOT NULL,
+            destination VARCHAR(200) NOT NULL,
+            mile_distance FLOAT,
+            kilometer_distance FLOAT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            created_at TIMESTAMP,
+            source_lat FLOAT,
+            source_lon FLOAT,
+            destination_lat FLOAT,
+            destination_lon FLOAT,
+            source_geohash VARCHAR(12),
+            destination_geohash VARCHAR(12),
+            CONSTRAINT route_history_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute(f"""
+        INSERT INTO route_history ({COLUMNS})
+        SELECT {COLUMNS} FROM route_history_partitioned
+    """)
+    op.execute("ALTER SEQUENCE route_history_id_seq OWNED BY route_history.id")
+    op.execute("DROP TABLE route_history_partitioned CASCADE")
+
+    _create_indexes()
+    op.drop_index('ix_route_history_user_created_at', table_name='route_history')
+
+    op.drop_index(op.f('ix_route_history_archive_id'), table_name='route_history_archive')
+    op.drop_table('route_history_archive')
@@ -1,10 +1,11 @@
 from datetime import datetime, timedelta
 import hashlib
-from typing import Dict
+import secrets
+from typing import Dict, Optional
 
 from jose import jwt, JWTError
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
@@ -96,4 +97,24 @@ def get_current_user(
             detail="User not found"
         )
 
-    return user
\ No newline at end of file
+    return user
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)) -> None:
+    """
+    Dependency guarding admin endpoints with the shared
+    ``settings.profiling_admin_token``.
+
+    Raises:
+        HTTPException: 404 if no admin token is configured,
+            403 if the header does not match it
+    """
+    if not settings.profiling_admin_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(
+        x_admin_token, settings.profiling_admin_token
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid admin token"
+        )
@@ -1,7 +1,10 @@
 import redis
 from pathlib import Path
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from app.constants import NOMINATIM_URL
+
 BASE_DIR = Path(__file__).resolve().parent
 ENV_FILE = BASE_DIR / ".env"
 
@@ -11,6 +14,33 @@ class Settings(BaseSettings):
     debug: bool = False
     cors_origins: str = ""
     groq_api_key: str
+    # Override to point at a compatible stand-in (e.g. the benchmark stubs)
+    groq_base_url: Optional[str] = None
+    nominatim_url: str = NOMINATIM_URL
+    throttle_enabled: bool = True
+    # History RAG retrieval: exact search up to rag_flat_max_rows,
+    # approximate (hnsw | ivf) above it
+    rag_max_rows: int = 100_000
+    rag_flat_max_rows: int = 5_000
+    rag_ann_index: Literal["hnsw", "ivf"] = "hnsw"
+    rag_hnsw_ef_search: int = 64
+    rag_ivf_nprobe: int = 16
+    # Optional local directory where cached indexes are kept and mmapped;
+    # files unused for HISTORY_INDEX_TTL or beyond the size cap are evicted
+    rag_local_cache_dir: Optional[str] = None
+    rag_local_cache_max_bytes: int = 1024 * 1024 * 1024
+    prompt_max_input_tokens: int = 1500
+    # Monthly route_history partitions older than this are archived to
+    # Parquet files under history_archive_dir (see app.retention). The
+    # partitions are dropped afterwards, so archiving is skipped unless the
+    # directory is set to an absolute path on persistent storage.
+    history_retention_months: int = 12
+    history_archive_dir: Optional[str] = None
+    # Opt-in request profiling (see app.profiling): profile a sampled
+    # fraction of requests and any request sending X-Profile: <admin token>
+    profiling_sample_rate: float = 0.0
+    profiling_admin_token: Optional[str] = None
+    profiling_cprofile: bool = False
     redis_host: str = "localhost"
     redis_port: int = 6379
     secret_key: str
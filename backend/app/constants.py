@@ -4,6 +4,63 @@ MAX_MEMORY = 10
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 CACHE_TTL = 900 
+WARMUP_LOCK_TTL = 300
+# How long an insights request waits for a running warmup build (seconds)
+WARMUP_WAIT_TIMEOUT = 30
+WARMUP_POLL_INTERVAL = 0.2
+HISTORY_PAGE_TTL = 300
+# Cached retrieval indexes outlive idle gaps: every history write appends to
+# or rebuilds them (and a failed update drops them), while a rebuild has to
+# re-embed up to rag_max_rows rows
+HISTORY_INDEX_TTL = 7 * 24 * 3600
+KM_TO_MILES = 0.621371
+# Mean Earth radius, shared by haversine distances and geohash coverage
+EARTH_RADIUS_KM = 6371.0
+
+# History export / import
+EXPORT_BATCH_SIZE = 1000
+IMPORT_BATCH_SIZE = 1000
+EXPORT_FIELDS = [
+    "source", "destination",
+    "distance_km", "distance_miles", "created_at",
+    "source_lat", "source_lon", "destination_lat", "destination_lon"
+]
+
+# route_history partitioning and cold storage
+PARTITION_PREMAKE_MONTHS = 3
+ARCHIVE_BATCH_SIZE = 10_000
+
+# Route statistics rollups
+STATS_DEFAULT_DAYS = 30
+STATS_TOP_DESTINATIONS = 5
+
+# Spatial lookups over stored route coordinates
+GEOHASH_PRECISION = 9
+NEARBY_MAX_RADIUS_KM = 500
+
+# History RAG vector index
+EMBED_BATCH_SIZE = 256
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+# Hybrid retrieval: candidates per ranking = k * oversample, fused with RRF
+RETRIEVAL_OVERSAMPLE = 4
+RRF_K = 60
+# Appends may grow an approximate index this far past rag_max_rows before
+# it is rebuilt from the newest rows
+RAG_APPEND_HEADROOM = 1.1
+# Deserialized approximate (HNSW / IVF) indexes kept per worker, capped by
+# their serialized size
+ANN_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Prompt budgeting for history insights
+CHARS_PER_TOKEN = 4
+PROMPT_RECENT_TURNS = 4
+PROMPT_SUMMARY_CHARS = 80
+QUESTION_MAX_CHARS = 1000
+
+# Opt-in request profiling
+PROFILE_KEEP_SLOWEST = 20
+PROFILE_TOP_FUNCTIONS = 30
 
 # Used for debug purpose
 MOCK_COORDS = {
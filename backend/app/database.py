@@ -3,8 +3,14 @@ from sqlalchemy.orm import sessionmaker, declarative_base
 from .config import settings
 from sentence_transformers import SentenceTransformer
 
+# SQLite connections are shared across FastAPI's threadpool workers
+connect_args = (
+    {"check_same_thread": False}
+    if settings.database_url.startswith("sqlite") else {}
+)
+
 engine = create_engine(
-    settings.database_url, pool_pre_ping=True
+    settings.database_url, pool_pre_ping=True, connect_args=connect_args
 )
 
 SessionLocal = sessionmaker(
@@ -0,0 +1,104 @@
+"""
+Geohash helpers used to index route endpoints for spatial lookups.
+
+A geohash interleaves longitude/latitude bisection bits into a base32
+string; points sharing a prefix lie in the same cell, so a B-tree index
+over the string turns "near X" into a handful of prefix range scans.
+"""
+
+import math
+from typing import List, Tuple
+
+from app.constants import EARTH_RADIUS_KM
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# Great-circle length of one degree of latitude on the haversine sphere
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(lat: float, lon: float, precision: int) -> str:
+    """
+    Encode a coordinate as a geohash.
+    Args:
+        lat, lon (float): Latitude and Longitude in decimal degrees.
+        precision (int): Number of characters.
+    Returns:
+        str: Geohash string.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits, bit_count, even = 0, 0, True
+
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits, bit_count = 0, 0
+
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """Return (lat_degrees, lon_degrees) spanned by a cell of this precision."""
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def coverage_km(precision: int, lat: float) -> float:
+    """
+    Radius guaranteed to be covered by a cell and its 8 neighbours, in
+    haversine distance: the smaller of the cell's height and the shortest
+    great-circle distance spanning one cell of longitude. The width is
+    taken at the highest latitude a point within one cell height can reach,
+    where cells are narrowest.
+    """
+    lat_deg, lon_deg = cell_size(precision)
+    edge_lat = min(abs(lat) + lat_deg, 90.0)
+    width = EARTH_RADIUS_KM * math.asin(
+        math.sin(math.radians(min(lon_deg, 90.0))) * math.cos(math.radians(edge_lat))
+    )
+    return min(lat_deg * KM_PER_DEGREE, width)
+
+
+def precision_for_radius(radius_km: float, lat: float, max_precision: int) -> int:
+    """
+    Finest precision whose 3x3 neighbourhood still covers radius_km,
+    or 0 if no precision does (large radii, or cells narrowed near the poles).
+    """
+    for precision in range(max_precision, 0, -1):
+        if coverage_km(precision, lat) >= radius_km:
+            return precision
+    return 0
+
+
+def neighbourhood(lat: float, lon: float, precision: int) -> List[str]:
+    """
+    Return the cell containing the point plus its (up to) 8 neighbours.
+    Neighbours are found by stepping one cell size in each direction,
+    wrapping longitude and dropping cells beyond the poles.
+    """
+    lat_deg, lon_deg = cell_size(precision)
+    cells = []
+    for dlat in (-lat_deg, 0.0, lat_deg):
+        n_lat = lat + dlat
+        if n_lat > 90.0 or n_lat < -90.0:
+            continue
+        for dlon in (-lon_deg, 0.0, lon_deg):
+            n_lon = (lon + dlon + 180.0) % 360.0 - 180.0
+            cell = encode(n_lat, n_lon, precision)
+            if cell not in cells:
+                cells.append(cell)
+    return cells
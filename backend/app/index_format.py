@@ -0,0 +1,232 @@
+"""
+Compact binary format for cached history retrieval indexes.
+
+Layout (little endian):
+
+    header    magic "RHIX", format version, row count, vector dimension,
+              16-byte content id, then (offset, length) of each section
+    sections  each aligned to SECTION_ALIGN bytes, in SECTIONS order:
+              - vectors: float32 [rows x dim], row-major (exact search only)
+              - created_at: int64 seconds (datetime64[s], NaT allowed)
+              - distance_km: float32 (NaN when unknown)
+              - row_ids: int64 History.id
+              - texts / sources / destinations: uint64 offsets [rows + 1]
+                followed by their UTF-8 bytes
+              - postings: sorted tokens (offsets + UTF-8), uint64 list
+                pointers [tokens + 1] and int64 row ids
+              - faiss: serialized HNSW/IVF index (approximate search only)
+
+Decoding never copies the fixed-width blocks: arrays are ``np.frombuffer``
+views into the blob (a Redis value or an mmapped file), and strings and
+postings are decoded lazily, one row or token at a time. The content id
+is a hash of the sections, so it also names the blob in the per-worker
+disk cache.
+"""
+
+import bisect
+import hashlib
+import struct
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Mapping, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from app.constants import ANN_CACHE_MAX_BYTES
+from app.retrieval import HistoryIndex
+
+MAGIC = b"RHIX"
+FORMAT_VERSION = 2
+SECTION_ALIGN = 64
+SECTIONS = (
+    "vectors", "created_at", "distance_km", "row_ids",
+    "text_offsets", "text_data",
+    "source_offsets", "source_data",
+    "destination_offsets", "destination_data",
+    "token_offsets", "token_data", "posting_offsets", "posting_ids",
+    "faiss",
+)
+HEADER = struct.Struct(f"<4sHQI16s{len(SECTIONS) * 2}Q")
+
+# Deserialized approximate indexes by content id with their serialized
+# size: unlike the other blocks they cannot be used in place, so follow-ups
+# in this worker reuse them. Shared by the threadpool, hence the lock.
+_ann_cache: "OrderedDict[bytes, Tuple[faiss.Index, int]]" = OrderedDict()
+_ann_cache_bytes = 0
+_ann_cache_lock = threading.Lock()
+
+
+class StringTable(Sequence):
+    """Read-only list of strings stored as offsets into a UTF-8 block."""
+
+    def __init__(self, offsets: np.ndarray, data: memoryview):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return str(self.data[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+
+class PostingsTable(Mapping):
+    """Read-only token -> row ids mapping over sorted tokens (binary search)."""
+
+    def __init__(self, tokens: StringTable, offsets: np.ndarray, ids: np.ndarray):
+        self.tokens = tokens
+        self.offsets = offsets
+        self.ids = ids
+
+    def __getitem__(self, token: str) -> np.ndarray:
+        i = bisect.bisect_left(self.tokens, token)
+        if i == len(self.tokens) or self.tokens[i] != token:
+            raise KeyError(token)
+        return self.ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.tokens)
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+
+def _encode_strings(strings: Sequence[str]) -> Tuple[bytes, bytes]:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets.tobytes(), b"".join(encoded)
+
+
+def _encode_postings(postings: Mapping[str, np.ndarray]) -> List[bytes]:
+    tokens = sorted(postings)
+    lists = [np.asarray(postings[t], dtype="<i8") for t in tokens]
+    offsets = np.zeros(len(tokens) + 1, dtype="<u8")
+    np.cumsum([len(ids) for ids in lists], out=offsets[1:])
+    ids = np.concatenate(lists) if lists else np.empty(0, dtype="<i8")
+    return [*_encode_strings(tokens), offsets.tobytes(), ids.tobytes()]
+
+
+def encode_history_index(history: HistoryIndex) -> bytes:
+    """
+    Serialize a retrieval index into the binary format.
+    Args:
+        history (HistoryIndex): Index built by build_user_index.
+    Returns:
+        bytes: Encoded blob.
+    """
+    rows = len(history.texts)
+    if history.index is None:
+        vectors = np.ascontiguousarray(history.vectors, dtype="<f4")
+        dim = vectors.shape[1]
+        ann = b""
+    else:
+        vectors = np.empty((0, history.index.d), dtype="<f4")
+        dim = history.index.d
+        ann = faiss.serialize_index(history.index).tobytes()
+
+    blocks = [
+        vectors.tobytes(),
+        np.asarray(history.created_at, dtype="datetime64[s]").astype("<i8").tobytes(),
+        np.asarray(history.distance_km, dtype="<f4").tobytes(),
+        np.asarray(history.row_ids, dtype="<i8").tobytes(),
+        *_encode_strings(history.texts),
+        *_encode_strings(history.sources),
+        *_encode_strings(history.destinations),
+        *_encode_postings(history.postings),
+        ann,
+    ]
+
+    sections = []
+    body = bytearray()
+    position = HEADER.size
+    for block in blocks:
+        padding = -position % SECTION_ALIGN
+        body += b"\0" * padding
+        position += padding
+        sections += [position, len(block)]
+        body += block
+        position += len(block)
+
+    content_id = hashlib.blake2b(body, digest_size=16).digest()
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, rows, dim, content_id, *sections)
+    return header + bytes(body)
+
+
+def content_id(blob) -> bytes:
+    """Content id of an encoded blob, read from its header."""
+    return HEADER.unpack_from(blob)[4]
+
+
+def _load_ann_index(cid: bytes, data: np.ndarray) -> faiss.Index:
+    """Deserialize an approximate index, reusing the per-worker LRU cache."""
+    global _ann_cache_bytes
+    with _ann_cache_lock:
+        cached = _ann_cache.get(cid)
+        if cached is not None:
+            _ann_cache.move_to_end(cid)
+            return cached[0]
+
+    index = faiss.deserialize_index(data)
+    with _ann_cache_lock:
+        if cid not in _ann_cache:
+            _ann_cache[cid] = (index, len(data))
+            _ann_cache_bytes += len(data)
+        # Keep at least the newest entry, even when it alone is over the cap
+        while _ann_cache_bytes > ANN_CACHE_MAX_BYTES and len(_ann_cache) > 1:
+            _, (_, size) = _ann_cache.popitem(last=False)
+            _ann_cache_bytes -= size
+    return index
+
+
+def decode_history_index(blob) -> HistoryIndex:
+    """
+    Load an encoded index as views into ``blob`` (bytes or mmap).
+
+    Raises:
+        ValueError: If the blob is not in this format or version
+    """
+    if len(blob) < HEADER.size:
+        raise ValueError("Truncated history index")
+    magic, version, rows, dim, cid, *bounds = HEADER.unpack_from(blob)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Unsupported history index format")
+
+    view = memoryview(blob)
+    sections: Dict[str, memoryview] = {}
+    for name, offset, length in zip(SECTIONS, bounds[::2], bounds[1::2]):
+        if offset + length > len(view):
+            raise ValueError("Truncated history index")
+        sections[name] = view[offset:offset + length]
+
+    def array(name: str, dtype: str) -> np.ndarray:
+        return np.frombuffer(sections[name], dtype=dtype)
+
+    def strings(name: str) -> StringTable:
+        return StringTable(array(f"{name}_offsets", "<u8"), sections[f"{name}_data"])
+
+    index = None
+    if len(sections["faiss"]):
+        index = _load_ann_index(cid, array("faiss", "uint8"))
+
+    return HistoryIndex(
+        index=index,
+        vectors=array("vectors", "<f4").reshape(-1, dim),
+        texts=strings("text"),
+        sources=strings("source"),
+        destinations=strings("destination"),
+        created_at=array("created_at", "<i8").view("datetime64[s]"),
+        distance_km=array("distance_km", "<f4"),
+        row_ids=array("row_ids", "<i8"),
+        postings=PostingsTable(
+            strings("token"), array("posting_offsets", "<u8"),
+            array("posting_ids", "<i8")
+        ),
+    )
@@ -1,9 +1,35 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from .database import *
-from app.routers import address_routes, auth_routes
+from app.config import redis_client
+from app.routers import address_routes, admin_routes, auth_routes
+from app.metrics import metrics_middleware, metrics_response
+from app.profiling import ProfilingMiddleware
+from app.service import close_http_client
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Drain shared connection pools on shutdown, so a recycled or stopped
+    worker closes its DB, Redis and HTTP connections cleanly.
+    """
+    yield
+    logger.info("Shutting down: closing HTTP, Redis and DB connection pools")
+    await close_http_client()
+    redis_client.connection_pool.disconnect()
+    engine.dispose()
 
-app = FastAPI()
+
+# orjson renders the (already validated) response models much faster
+# than the stdlib json encoder
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_allow_origins,
@@ -11,9 +37,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.middleware("http")(metrics_middleware)
+app.add_middleware(ProfilingMiddleware)
 app.include_router(auth_routes.router)
 app.include_router(address_routes.router)
+app.include_router(admin_routes.router)
 
 @app.get("/")
 async def root():
-    return {"message": "Welcome to my FastAPI app!"}
\ No newline at end of file
+    return {"message": "Welcome to my FastAPI app!"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
@@ -0,0 +1,140 @@
+"""
+Prometheus metrics for request latency, caches, upstream services and
+internal pipeline stages, exposed on ``/metrics``.
+
+Under gunicorn (``PROMETHEUS_MULTIPROC_DIR`` set) each worker writes its
+samples to shared files and ``/metrics`` aggregates all workers.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from fastapi import Request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+    REGISTRY, generate_latest, multiprocess
+)
+from starlette.responses import Response
+
+from app.database import engine
+from app.profiling import record_span
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Redis cache lookups by key family and result",
+    ["cache", "result"],
+)
+
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of calls to external services",
+    ["service"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds",
+    "Latency of internal pipeline stages",
+    ["stage"],
+)
+
+EMBEDDING_BATCH_SIZE = Histogram(
+    "embedding_batch_size",
+    "Number of texts encoded per embedding call",
+    buckets=(1, 5, 10, 50, 100, 250, 500, 1000, 5000),
+)
+
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Database connections currently in use",
+    multiprocess_mode="livesum",
+)
+
+DB_POOL_CHECKED_IN = Gauge(
+    "db_pool_checked_in",
+    "Idle database connections in the pool",
+    multiprocess_mode="livesum",
+)
+
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Database connections opened beyond the pool size",
+    multiprocess_mode="livesum",
+)
+
+
+def update_pool_gauges() -> None:
+    """Sample SQLAlchemy pool usage for this process."""
+    pool = engine.pool
+    if hasattr(pool, "checkedout"):
+        DB_POOL_CHECKED_OUT.set(pool.checkedout())
+        DB_POOL_CHECKED_IN.set(pool.checkedin())
+        DB_POOL_OVERFLOW.set(pool.overflow())
+
+
+@contextmanager
+def track_stage(stage: str):
+    """Time a block of code under the given stage label."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage).observe(elapsed)
+        record_span(stage, start, elapsed)
+
+
+@contextmanager
+def track_upstream(service: str):
+    """Time a call to an external service."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        UPSTREAM_LATENCY.labels(service).observe(elapsed)
+        record_span(service, start, elapsed)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Count a cache hit or miss for a key family (e.g. ``geo``)."""
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+async def metrics_middleware(request: Request, call_next):
+    """
+    Observe request latency per route template. Unmatched paths are
+    grouped under a single label to keep cardinality bounded.
+    """
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        update_pool_gauges()
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            request.method,
+            route.path if route else "unmatched",
+            str(status),
+        ).observe(time.perf_counter() - start)
+
+
+def metrics_response() -> Response:
+    """Render all registered metrics in the Prometheus text format."""
+    update_pool_gauges()
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
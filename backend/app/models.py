@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, DateTime, Float, Integer, String, ForeignKey, Text
+from sqlalchemy import Column, Date, DateTime, Float, Index, Integer, String, ForeignKey, Text
 from sqlalchemy.orm import relationship, validates
 from app.database import Base
 
@@ -25,6 +25,8 @@ class User(Base):
         return value
 
 class History(Base):
+    # Range-partitioned by created_at (monthly) in Postgres, with a
+    # (id, created_at) primary key; see migration c7a1e4d9b2f6.
     __tablename__ = 'route_history'
     id = Column(Integer, primary_key=True, index=True)
 
@@ -34,12 +36,75 @@ class History(Base):
     mile_distance = Column(Float, nullable=True)
     kilometer_distance = Column(Float, nullable=True)
 
+    # Geocoded endpoints; null for rows recorded before coordinates were kept
+    source_lat = Column(Float, nullable=True)
+    source_lon = Column(Float, nullable=True)
+    destination_lat = Column(Float, nullable=True)
+    destination_lon = Column(Float, nullable=True)
+    source_geohash = Column(String(12), nullable=True)
+    destination_geohash = Column(String(12), nullable=True)
+
     user_id = Column(
         Integer,
         ForeignKey("users.id", ondelete="CASCADE"),
         nullable=False
     )
-    created_at=Column(DateTime, default=datetime.utcnow)
+    created_at=Column(DateTime, nullable=False, default=datetime.utcnow)
     user = relationship(
         "User", back_populates="histories"
     )
+
+    __table_args__ = (
+        Index("ix_route_history_user_created_at", "user_id", "created_at"),
+        Index(
+            "ix_route_history_user_source_geohash", "user_id", "source_geohash",
+            postgresql_ops={"source_geohash": "varchar_pattern_ops"}
+        ),
+        Index(
+            "ix_route_history_user_destination_geohash", "user_id", "destination_geohash",
+            postgresql_ops={"destination_geohash": "varchar_pattern_ops"}
+        ),
+    )
+
+
+class DailyRouteStats(Base):
+    """Per user per day rollup, maintained incrementally on history insert."""
+    __tablename__ = 'route_stats_daily'
+
+    user_id = Column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    day = Column(Date, primary_key=True)
+
+    route_count = Column(Integer, nullable=False, default=0)
+    total_km = Column(Float, nullable=False, default=0.0)
+
+
+class DestinationRouteStats(Base):
+    """Per user per destination rollup, maintained incrementally on history insert."""
+    __tablename__ = 'route_stats_destination'
+
+    user_id = Column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    destination = Column(String(200), primary_key=True)
+
+    route_count = Column(Integer, nullable=False, default=0)
+    total_km = Column(Float, nullable=False, default=0.0)
+
+
+class HistoryArchive(Base):
+    """A monthly route_history partition moved to cold storage (Parquet)."""
+    __tablename__ = 'route_history_archive'
+
+    id = Column(Integer, primary_key=True, index=True)
+    partition_name = Column(String(100), unique=True, nullable=False)
+    range_start = Column(DateTime, nullable=False)
+    range_end = Column(DateTime, nullable=False)
+    path = Column(String(500), nullable=False)
+    row_count = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
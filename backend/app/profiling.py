@@ -0,0 +1,229 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it is sampled (``settings.profiling_sample_rate``)
+or sends ``X-Profile: <settings.profiling_admin_token>``. For profiled
+requests every ``track_stage`` / ``track_upstream`` block and every SQL
+statement is recorded as a span, and endpoints decorated with ``profile_endpoint`` also collect a
+cProfile report when ``settings.profiling_cprofile`` is on. The slowest
+PROFILE_KEEP_SLOWEST requests across all workers are kept in Redis and
+served by ``/admin/profiles``.
+
+With profiling off, the cost per request is a settings check in the (pure
+ASGI) middleware and a context variable read per stage or SQL statement.
+"""
+
+import asyncio
+import cProfile
+import io
+import pstats
+import random
+import secrets
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import event
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings, redis_client
+from app.constants import PROFILE_KEEP_SLOWEST, PROFILE_TOP_FUNCTIONS
+from app.database import engine
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROFILES_KEY = "profiles:slowest"
+UNPROFILED_PREFIXES = ("/admin", "/metrics")
+
+
+@dataclass
+class RequestProfile:
+    """Spans (name, start offset, duration in seconds) of one request."""
+    started_at: datetime
+    start: float
+    spans: List[Tuple[str, float, float]] = field(default_factory=list)
+    cprofile: Optional[str] = None
+    closed: bool = False
+    end: Optional[float] = None
+
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar(
+    "current_profile", default=None
+)
+
+# cProfile hooks the whole thread, so only one collector may run at a time
+_cprofile_lock = threading.Lock()
+
+
+def record_span(name: str, start: float, elapsed: float) -> None:
+    """Attach a timed block to the current request's profile, if any."""
+    profile = _current_profile.get()
+    if profile is not None and not profile.closed:
+        profile.spans.append((name, start - profile.start, elapsed))
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None and conn.info.get("profile_query_start"):
+        start = conn.info["profile_query_start"].pop()
+        record_span("db_query", start, time.perf_counter() - start)
+
+
+def _should_profile(scope: Scope) -> bool:
+    token = settings.profiling_admin_token
+    if token:
+        header = Headers(scope=scope).get("x-profile")
+        if header and secrets.compare_digest(header, token):
+            return True
+    rate = settings.profiling_sample_rate
+    return rate > 0 and random.random() < rate
+
+
+def _store_profile(profile: RequestProfile, scope: Scope, status: int) -> None:
+    """Keep the profile if it is among the slowest PROFILE_KEEP_SLOWEST."""
+    route = scope.get("route")
+    duration = (profile.end or time.perf_counter()) - profile.start
+    entry = {
+        "id": uuid.uuid4().hex,
+        "method": scope["method"],
+        "path": route.path if route else scope["path"],
+        "status": status,
+        "started_at": profile.started_at,
+        "duration_ms": duration * 1000,
+        "spans": [
+            {"name": name, "start_ms": offset * 1000, "duration_ms": elapsed * 1000}
+            for name, offset, elapsed in profile.spans
+        ],
+        "cprofile": profile.cprofile,
+    }
+    pipe = redis_client.pipeline()
+    pipe.zadd(PROFILES_KEY, {orjson.dumps(entry): duration})
+    pipe.zremrangebyrank(PROFILES_KEY, 0, -PROFILE_KEEP_SLOWEST - 1)
+    pipe.execute()
+
+
+class ProfilingMiddleware:
+    """
+    Profile sampled or explicitly requested requests.
+
+    Written as plain ASGI rather than an ``@app.middleware("http")``
+    function, so unprofiled requests pass straight through without being
+    wrapped in a Request / streaming response pair.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["path"].startswith(UNPROFILED_PREFIXES)
+            or not _should_profile(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(started_at=datetime.utcnow(), start=time.perf_counter())
+        status = 500
+
+        async def send_and_track(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                # Background tasks still run in this context after the response
+                profile.closed = True
+                profile.end = time.perf_counter()
+
+        context_token = _current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_and_track)
+        finally:
+            profile.closed = True
+            _current_profile.reset(context_token)
+            try:
+                _store_profile(profile, scope, status)
+            except Exception as e:
+                logger.warning(f"Failed to store request profile: {e}")
+
+
+def _start_cprofile(profile: Optional[RequestProfile]) -> Optional[cProfile.Profile]:
+    if (
+        profile is None
+        or not settings.profiling_cprofile
+        or not _cprofile_lock.acquire(blocking=False)
+    ):
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _finish_cprofile(profile: RequestProfile, profiler: Optional[cProfile.Profile]) -> None:
+    if profiler is None:
+        return
+    profiler.disable()
+    _cprofile_lock.release()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(
+        PROFILE_TOP_FUNCTIONS
+    )
+    profile.cprofile = out.getvalue()
+
+
+def profile_endpoint(func):
+    """
+    Collect a cProfile report for profiled requests to this endpoint.
+
+    The profiler runs in the thread executing the endpoint: the worker
+    thread for sync endpoints, the event loop for async ones (where other
+    requests interleaving with this one are included in the report).
+    """
+    if asyncio.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            profile = _current_profile.get()
+            profiler = _start_cprofile(profile)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _finish_cprofile(profile, profiler)
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        profiler = _start_cprofile(profile)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _finish_cprofile(profile, profiler)
+    return wrapper
+
+
+def get_slowest_profiles() -> List[Dict]:
+    """Stored request profiles, slowest first."""
+    return [
+        orjson.loads(entry)
+        for entry in redis_client.zrevrange(PROFILES_KEY, 0, -1)
+    ]
+
+
+def clear_profiles() -> None:
+    """Drop all stored request profiles."""
+    redis_client.delete(PROFILES_KEY)
@@ -0,0 +1,126 @@
+"""
+Token-budgeted prompt construction for history insights.
+
+The prompt is assembled from the question, retrieved route records and
+chat memory, compacted and trimmed so the whole LLM input (including the
+system prompt) stays under ``settings.prompt_max_input_tokens``.
+"""
+
+import math
+from typing import Dict, List
+
+from app.config import settings
+from app.constants import (
+    CHARS_PER_TOKEN, PROMPT_RECENT_TURNS, PROMPT_SUMMARY_CHARS
+)
+
+SYSTEM_PROMPT = (
+    "You are a route history assistant. "
+    "Answer ONLY using the provided route records and conversation. "
+    "If the data is missing or insufficient, say you don't know. "
+    "Keep answers under 3 sentences and do not explain your reasoning."
+)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimate the token count of a text.
+    Uses a characters-per-token ratio, which is close enough for budgeting
+    and avoids loading a tokenizer for the hosted model.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def compact_routes(records: List[Dict]) -> List[str]:
+    """
+    Render route records as table rows, merging repeats of the same
+    route and distance into one row with a trip count and latest date.
+    Rows keep the order of first appearance (i.e. retrieval rank).
+    """
+    merged: Dict[tuple, Dict] = {}
+    for r in records:
+        key = (r["source"], r["destination"], r["distance_km"])
+        entry = merged.setdefault(key, {"trips": 0, "latest": None})
+        entry["trips"] += 1
+        if r["created_at"] is not None and (
+            entry["latest"] is None or r["created_at"] > entry["latest"]
+        ):
+            entry["latest"] = r["created_at"]
+
+    return [
+        f"{src}|{dst}|{'?' if km is None else km}|{e['trips']}|"
+        f"{e['latest'].date().isoformat() if e['latest'] else '?'}"
+        for (src, dst, km), e in merged.items()
+    ]
+
+
+def summarize_turns(turns: List[Dict]) -> str:
+    """
+    Cheap extractive summary of older turns: the questions the user
+    asked, each shortened, without spending an LLM call.
+    """
+    questions = [
+        t["content"][:PROMPT_SUMMARY_CHARS] for t in turns if t["role"] == "user"
+    ]
+    if not questions:
+        return ""
+    return "Earlier the user asked: " + "; ".join(questions)
+
+
+def _render(summary: str, turns: List[Dict], routes: List[str], question: str) -> str:
+    parts = []
+    if summary:
+        parts.append(summary)
+    if turns:
+        parts.append(
+            "Conversation:\n" + "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+        )
+    table = "\n".join(routes) if routes else "(none)"
+    parts.append(f"Route records (from|to|km|trips|latest):\n{table}")
+    parts.append(f"Question:\n{question}")
+    return "\n\n".join(parts)
+
+
+def build_prompt(
+    question: str,
+    route_records: List[Dict],
+    memory: List[Dict]
+) -> str:
+    """
+    Build the user prompt for the LLM within the input token budget.
+
+    Older turns are folded into a one-line summary and the most recent
+    PROMPT_RECENT_TURNS are kept verbatim. When over budget, content is
+    dropped in order of least value: the summary, then the oldest recent
+    turns, then the lowest-ranked route rows (at least one row is kept),
+    and finally the question itself is truncated.
+
+    Args:
+        question (str): User question.
+        route_records (List[Dict]): Retrieved routes, best match first.
+        memory (List[Dict]): Chat memory for the session.
+    Returns:
+        str: Prompt text (the system prompt is sent separately).
+    """
+    budget = settings.prompt_max_input_tokens - count_tokens(SYSTEM_PROMPT)
+
+    recent = memory[-PROMPT_RECENT_TURNS:]
+    summary = summarize_turns(memory[:-PROMPT_RECENT_TURNS])
+    routes = compact_routes(route_records)
+
+    prompt = _render(summary, recent, routes, question)
+    while count_tokens(prompt) > budget:
+        if summary:
+            summary = ""
+        elif recent:
+            recent = recent[1:]
+        elif len(routes) > 1:
+            routes = routes[:-1]
+        else:
+            overflow = (count_tokens(prompt) - budget) * CHARS_PER_TOKEN
+            question = question[:max(0, len(question) - overflow)]
+            prompt = _render(summary, recent, routes, question)
+            break
+        prompt = _render(summary, recent, routes, question)
+
+    return prompt
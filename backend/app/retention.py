@@ -0,0 +1,315 @@
+"""
+Partition maintenance and cold storage for route history.
+
+In Postgres ``route_history`` is range-partitioned by ``created_at`` into
+monthly partitions named ``route_history_yYYYYmMM`` plus a default
+partition (migration c7a1e4d9b2f6). Run this module daily, e.g. from cron:
+
+    python -m app.retention
+
+It creates the partitions for the coming months and moves partitions
+older than ``settings.history_retention_months`` to zstd-compressed
+Parquet files under ``settings.history_archive_dir`` (an absolute path on
+persistent storage; archiving is skipped while it is unset), after which
+they are detached and dropped. Archived months stay readable per user
+through ``read_archived_history``.
+"""
+
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.constants import ARCHIVE_BATCH_SIZE, PARTITION_PREMAKE_MONTHS
+from app.database import SessionLocal
+from app.models import History, HistoryArchive
+from app.service import (
+    add_months, bump_history_version, drop_history_index, month_floor
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r"^route_history_y(\d{4})m(\d{2})$")
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("user_id", pa.int64()),
+    ("source", pa.string()),
+    ("destination", pa.string()),
+    ("kilometer_distance", pa.float64()),
+    ("mile_distance", pa.float64()),
+    ("created_at", pa.timestamp("us")),
+    ("source_lat", pa.float64()),
+    ("source_lon", pa.float64()),
+    ("destination_lat", pa.float64()),
+    ("destination_lon", pa.float64()),
+])
+
+
+def partition_name(month: datetime) -> str:
+    """Name of the route_history partition holding the given month."""
+    return f"route_history_y{month:%Y}m{month:%m}"
+
+
+def is_partitioned(db: Session) -> bool:
+    """True when route_history is a partitioned Postgres table."""
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table "
+        "WHERE partrelid = 'route_history'::regclass"
+    )).first() is not None
+
+
+def list_partitions(db: Session) -> Dict[datetime, str]:
+    """Monthly partitions currently attached to route_history, by month start."""
+    names = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'route_history'::regclass"
+    )).scalars()
+
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[datetime(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def ensure_future_partitions(
+    db: Session,
+    months_ahead: int = PARTITION_PREMAKE_MONTHS
+) -> List[str]:
+    """
+    Create the partitions for the current and next ``months_ahead`` months.
+
+    Rows for a missing month land in the default partition; they are moved
+    into the new partition before it is attached (attaching fails while
+    the default partition still holds rows in its range).
+
+    Args:
+        db (Session): Database session.
+        months_ahead (int): Months to provision beyond the current one.
+    Returns:
+        List[str]: Names of the partitions created.
+    """
+    existing = list_partitions(db)
+    current = month_floor(datetime.utcnow())
+    created = []
+
+    for offset in range(months_ahead + 1):
+        start = add_months(current, offset)
+        if start in existing:
+            continue
+        end = add_months(start, 1)
+        name = partition_name(start)
+        bounds = {"start": start, "end": end}
+
+        db.execute(text(
+            f'CREATE TABLE "{name}" '
+            f"(LIKE route_history INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        ))
+        db.execute(text(
+            f'WITH moved AS ('
+            f"DELETE FROM route_history_default "
+            f"WHERE created_at >= :start AND created_at < :end RETURNING *"
+            f') INSERT INTO "{name}" SELECT * FROM moved'
+        ), bounds)
+        db.execute(text(
+            f'ALTER TABLE route_history ATTACH PARTITION "{name}" '
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        db.commit()
+        created.append(name)
+        logger.info(f"Created partition {name}")
+
+    return created
+
+
+def archive_dir() -> Optional[Path]:
+    """Configured archive directory, or None if archiving is not set up."""
+    if not settings.history_archive_dir:
+        return None
+    path = Path(settings.history_archive_dir)
+    if not path.is_absolute():
+        raise ValueError(
+            "HISTORY_ARCHIVE_DIR must be an absolute path on persistent storage"
+        )
+    return path
+
+
+def archive_path(name: str) -> Path:
+    """Parquet file a partition is archived to."""
+    return archive_dir() / f"{name}.parquet"
+
+
+def _write_batch(writer: pq.ParquetWriter, batch: List[Dict]) -> None:
+    writer.write_table(pa.Table.from_pylist(batch, schema=ARCHIVE_SCHEMA))
+
+
+def archive_partition(db: Session, month: datetime, name: str) -> HistoryArchive:
+    """
+    Copy one monthly partition to a Parquet file, then detach and drop it.
+
+    Rows are streamed with a server-side cursor and written in row groups
+    of ARCHIVE_BATCH_SIZE, sorted by user so per-user reads can skip most
+    row groups from their statistics. The partition is locked against
+    writes for the whole transaction, and it is only dropped once both the
+    rows written and the finished file's row count match COUNT(*) of the
+    partition. The file is written under a temporary name and renamed once
+    complete, so an interrupted run can simply be repeated.
+
+    Args:
+        db (Session): Database session.
+        month (datetime): First day of the partition's month.
+        name (str): Partition table name.
+    Returns:
+        HistoryArchive: Record of the archived partition.
+    """
+    end = add_months(month, 1)
+    path = archive_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".parquet.tmp")
+
+    db.execute(text(f'LOCK TABLE "{name}" IN SHARE MODE'))
+    expected = db.execute(text(f'SELECT count(*) FROM "{name}"')).scalar()
+
+    rows = (
+        db.query(*(getattr(History, field.name) for field in ARCHIVE_SCHEMA))
+        .filter(History.created_at >= month, History.created_at < end)
+        .order_by(History.user_id, History.created_at)
+        .yield_per(ARCHIVE_BATCH_SIZE)
+    )
+
+    row_count = 0
+    user_ids: Set[int] = set()
+    batch = []
+    with pq.ParquetWriter(tmp_path, ARCHIVE_SCHEMA, compression="zstd") as writer:
+        for row in rows:
+            batch.append(row._asdict())
+            user_ids.add(row.user_id)
+            if len(batch) == ARCHIVE_BATCH_SIZE:
+                _write_batch(writer, batch)
+                row_count += len(batch)
+                batch = []
+        if batch:
+            _write_batch(writer, batch)
+            row_count += len(batch)
+    os.replace(tmp_path, path)
+
+    written = pq.ParquetFile(path).metadata.num_rows
+    if row_count != expected or written != expected:
+        db.rollback()
+        path.unlink()
+        raise RuntimeError(
+            f"Archive of {name} is incomplete: {expected} rows in the "
+            f"partition, {row_count} streamed, {written} in {path}"
+        )
+
+    archive = HistoryArchive(
+        partition_name=name,
+        range_start=month,
+        range_end=end,
+        path=str(path),
+        row_count=row_count,
+    )
+    db.add(archive)
+    db.execute(text(f'ALTER TABLE route_history DETACH PARTITION "{name}"'))
+    db.execute(text(f'DROP TABLE "{name}"'))
+    db.commit()
+
+    # Cached history pages, ETags and retrieval indexes still hold the
+    # archived rows
+    for user_id in user_ids:
+        bump_history_version(user_id)
+        drop_history_index(user_id)
+
+    logger.info(f"Archived partition {name} ({row_count} rows) to {path}")
+    return archive
+
+
+def archive_old_partitions(db: Session) -> List[HistoryArchive]:
+    """
+    Archive every monthly partition that ended more than
+    ``settings.history_retention_months`` months ago.
+    """
+    cutoff = add_months(
+        month_floor(datetime.utcnow()), -settings.history_retention_months
+    )
+    return [
+        archive_partition(db, month, name)
+        for month, name in sorted(list_partitions(db).items())
+        if month < cutoff
+    ]
+
+
+def read_archived_history(
+    db: Session,
+    user_id: int,
+    month: datetime
+) -> Optional[List[Dict]]:
+    """
+    Read a user's routes for one archived month back from cold storage.
+
+    Args:
+        db (Session): Database session.
+        user_id (int): Owner of the history.
+        month (datetime): First day of the month.
+    Returns:
+        Optional[List[Dict]]: Routes (newest first), or None if the month
+            is not archived.
+    """
+    archive = (
+        db.query(HistoryArchive)
+        .filter(HistoryArchive.range_start == month)
+        .first()
+    )
+    if archive is None:
+        return None
+
+    table = pq.read_table(
+        archive.path,
+        columns=[
+            "source", "destination", "kilometer_distance", "mile_distance",
+            "created_at"
+        ],
+        filters=[("user_id", "=", user_id)],
+    )
+    return sorted(table.to_pylist(), key=lambda r: r["created_at"], reverse=True)
+
+
+def run_retention() -> Tuple[List[str], List[HistoryArchive]]:
+    """Provision upcoming partitions and archive expired ones."""
+    db = SessionLocal()
+    try:
+        if not is_partitioned(db):
+            logger.info("route_history is not partitioned; nothing to do")
+            return [], []
+        created = ensure_future_partitions(db)
+        if archive_dir() is None:
+            logger.warning("HISTORY_ARCHIVE_DIR is not set; skipping archival")
+            return created, []
+        return created, archive_old_partitions(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    created, archived = run_retention()
+    logger.info(
+        f"Retention done: {len(created)} partitions created, "
+        f"{len(archived)} archived"
+    )
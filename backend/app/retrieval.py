@@ -0,0 +1,285 @@
+"""
+Hybrid lexical + vector retrieval over a user's route history.
+
+Questions are first parsed for structured constraints (dates, distances)
+that pre-filter rows; place names are matched through an inverted index
+over source/destination tokens; and the lexical ranking is fused with the
+FAISS ranking using reciprocal rank fusion.
+"""
+
+import math
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Mapping, NamedTuple, Optional, Sequence
+
+import faiss
+import numpy as np
+
+from app.constants import KM_TO_MILES, RRF_K
+
+TOKEN_RE = re.compile(r"\w+")
+STOPWORDS = {
+    "the", "and", "of", "to", "from", "in", "on", "at", "my", "me", "i",
+    "a", "an", "route", "routes", "trip", "trips", "what", "which", "when",
+    "where", "how", "many", "much", "did", "do", "was", "were", "is", "are",
+    "st", "rd", "road", "street",
+}
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+# Full month names and standard abbreviations only, so places such as
+# "Marseille" or "Augsburg" are not read as months
+MONTH_RE = re.compile(
+    r"\b(?:in|during|of)\s+"
+    r"(january|february|march|april|may|june|july|august|september|october|"
+    r"november|december|jan|feb|mar|apr|jun|jul|aug|sept|sep|oct|nov|dec)\b"
+    r"\.?(?:\s+(\d{4})\b)?"
+)
+YEAR_RE = re.compile(r"\b(?:in|during)\s+(\d{4})\b")
+RELATIVE_RE = re.compile(r"\b(?:last|past)\s+(\d+\s+)?(day|week|month|year)s?\b")
+MIN_DISTANCE_RE = re.compile(
+    r"\b(?:over|above|more than|longer than|greater than|at least)\s+"
+    r"(\d+(?:\.\d+)?)\s*(km|kilomet\w*|mi\b|miles?)"
+)
+MAX_DISTANCE_RE = re.compile(
+    r"\b(?:under|below|less than|shorter than|at most|within)\s+"
+    r"(\d+(?:\.\d+)?)\s*(km|kilomet\w*|mi\b|miles?)"
+)
+RELATIVE_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords or single characters."""
+    return [
+        t for t in TOKEN_RE.findall(text.lower())
+        if len(t) > 1 and t not in STOPWORDS
+    ]
+
+
+@dataclass
+class QueryFilters:
+    """Structured constraints extracted from a question."""
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    month: Optional[int] = None
+    min_km: Optional[float] = None
+    max_km: Optional[float] = None
+
+    @property
+    def active(self) -> bool:
+        return any(
+            v is not None
+            for v in (self.start, self.end, self.month, self.min_km, self.max_km)
+        )
+
+
+def _to_km(value: str, unit: str) -> float:
+    return float(value) / KM_TO_MILES if unit.startswith("mi") else float(value)
+
+
+def parse_question_filters(question: str, now: Optional[datetime] = None) -> QueryFilters:
+    """
+    Extract date and distance constraints such as "in March 2025",
+    "last 2 weeks", "yesterday" or "longer than 100 km".
+    """
+    text = question.lower()
+    now = now or datetime.utcnow()
+    filters = QueryFilters()
+
+    if match := MONTH_RE.search(text):
+        month = MONTHS[match.group(1)[:3]]
+        if match.group(2):
+            year = int(match.group(2))
+            filters.start = datetime(year, month, 1)
+            filters.end = datetime(year + month // 12, month % 12 + 1, 1)
+        else:
+            filters.month = month
+    elif match := YEAR_RE.search(text):
+        year = int(match.group(1))
+        filters.start, filters.end = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+    elif match := RELATIVE_RE.search(text):
+        count = int(match.group(1) or 1)
+        filters.start = now - timedelta(days=count * RELATIVE_DAYS[match.group(2)])
+    elif "yesterday" in text:
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        filters.start, filters.end = today - timedelta(days=1), today
+    elif "today" in text:
+        filters.start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    if match := MIN_DISTANCE_RE.search(text):
+        filters.min_km = _to_km(match.group(1), match.group(2))
+    if match := MAX_DISTANCE_RE.search(text):
+        filters.max_km = _to_km(match.group(1), match.group(2))
+
+    return filters
+
+
+class RouteRow(NamedTuple):
+    """Columns of a History row that the retrieval index is built from."""
+    id: int
+    source: str
+    destination: str
+    kilometer_distance: Optional[float]
+    created_at: Optional[datetime]
+
+
+@dataclass
+class HistoryIndex:
+    """
+    Everything needed to answer retrieval queries for one user's history.
+    Built from lists by build_user_index, or decoded as read-only views by
+    app.index_format.
+    """
+    # Approximate (HNSW / IVF) index, or None for exact search over vectors
+    index: Optional[faiss.Index]
+    vectors: np.ndarray                 # float32 rows x dim; empty with an index
+    texts: Sequence[str]
+    # Per-row metadata, aligned with texts and vector / FAISS ids
+    sources: Sequence[str]
+    destinations: Sequence[str]
+    created_at: np.ndarray              # datetime64[s], NaT when unknown
+    distance_km: np.ndarray             # float32, NaN when unknown
+    row_ids: np.ndarray                 # int64 History.id
+    postings: Mapping[str, np.ndarray] = field(default_factory=dict)
+
+    def record(self, i: int) -> Dict:
+        """Structured view of row i, for prompt building."""
+        created = self.created_at[i]
+        km = self.distance_km[i]
+        return {
+            "source": self.sources[i],
+            "destination": self.destinations[i],
+            "distance_km": None if np.isnan(km) else round(float(km), 2),
+            "created_at": None if np.isnat(created) else created.astype(datetime),
+        }
+
+
+def build_postings(rows: List) -> Dict[str, np.ndarray]:
+    """Inverted index from source/destination tokens to row ids."""
+    postings: Dict[str, List[int]] = {}
+    for i, row in enumerate(rows):
+        for token in set(tokenize(f"{row.source} {row.destination}")):
+            postings.setdefault(token, []).append(i)
+    return {t: np.asarray(ids, dtype=np.int64) for t, ids in postings.items()}
+
+
+def filter_mask(history: HistoryIndex, filters: QueryFilters) -> Optional[np.ndarray]:
+    """Boolean mask of rows satisfying the filters, or None if unfiltered."""
+    if not filters.active:
+        return None
+
+    mask = np.ones(len(history.texts), dtype=bool)
+    created = history.created_at
+    if filters.start is not None:
+        mask &= created >= np.datetime64(filters.start, "s")
+    if filters.end is not None:
+        mask &= created < np.datetime64(filters.end, "s")
+    if filters.month is not None:
+        months = created.astype("datetime64[M]").astype(np.int64) % 12 + 1
+        mask &= ~np.isnat(created) & (months == filters.month)
+    if filters.min_km is not None:
+        mask &= history.distance_km >= filters.min_km
+    if filters.max_km is not None:
+        mask &= history.distance_km <= filters.max_km
+    return mask
+
+
+def lexical_ranking(
+    history: HistoryIndex,
+    question: str,
+    mask: Optional[np.ndarray],
+    limit: int
+) -> List[int]:
+    """Rank rows by summed IDF of question tokens found in their places."""
+    tokens = [t for t in set(tokenize(question)) if t in history.postings]
+    if not tokens:
+        return []
+
+    n = len(history.texts)
+    scores = np.zeros(n, dtype=np.float32)
+    for token in tokens:
+        ids = history.postings[token]
+        scores[ids] += math.log(1 + n / len(ids))
+    if mask is not None:
+        scores[~mask] = 0
+
+    candidates = np.flatnonzero(scores)
+    if len(candidates) > limit:
+        candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+    return candidates[np.argsort(-scores[candidates], kind="stable")].tolist()
+
+
+def dense_ranking(
+    history: HistoryIndex,
+    q_vec: np.ndarray,
+    mask: Optional[np.ndarray],
+    limit: int,
+    params: faiss.SearchParameters,
+    exact_max_rows: int
+) -> List[int]:
+    """
+    Vector ranking, restricted to the masked rows when a filter is active.
+
+    Uses an exact inner product over the stored vectors when there is no
+    approximate index. With one, a filter selecting at most
+    ``exact_max_rows`` rows is also scored exactly, over the vectors
+    reconstructed from the index: HNSW and IVF only visit a bounded part
+    of the index, so a selective filter leaves them with few or no
+    allowed neighbours. Wider filters search the index with efSearch /
+    nprobe raised in proportion to the share of rows filtered out.
+    """
+    if history.index is None:
+        return exact_ranking(history.vectors, q_vec[0], mask, limit)
+
+    selector = None
+    if mask is not None:
+        allowed = np.flatnonzero(mask)
+        if not len(allowed):
+            return []
+        if len(allowed) <= exact_max_rows:
+            vectors = history.index.reconstruct_batch(allowed)
+            return allowed[exact_ranking(vectors, q_vec[0], None, limit)].tolist()
+
+        limit = min(limit, len(allowed))
+        scale = history.index.ntotal / len(allowed)
+        if isinstance(params, faiss.SearchParametersHNSW):
+            params.efSearch = min(
+                math.ceil(params.efSearch * scale), history.index.ntotal
+            )
+        elif isinstance(params, faiss.SearchParametersIVF):
+            params.nprobe = min(
+                math.ceil(params.nprobe * scale), history.index.nlist
+            )
+        # Keep a Python reference: params.sel does not own the selector.
+        selector = faiss.IDSelectorBatch(allowed)
+        params.sel = selector
+
+    _, ids = history.index.search(q_vec, min(limit, history.index.ntotal), params=params)
+    # FAISS pads with -1 when fewer than `limit` neighbours are found
+    return [i for i in ids[0].tolist() if i >= 0]
+
+
+def exact_ranking(
+    vectors: np.ndarray,
+    q_vec: np.ndarray,
+    mask: Optional[np.ndarray],
+    limit: int
+) -> List[int]:
+    """Exact top-`limit` rows by inner product (cosine on normalized vectors)."""
+    scores = vectors @ q_vec
+    candidates = np.arange(len(scores)) if mask is None else np.flatnonzero(mask)
+    if len(candidates) > limit:
+        candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+    return candidates[np.argsort(-scores[candidates], kind="stable")].tolist()
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int) -> List[int]:
+    """Fuse several rankings of row ids; higher in any list ranks higher overall."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row_id in enumerate(ranking):
+            scores[row_id] = scores.get(row_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
@@ -1,23 +1,46 @@
-import pickle
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import (
+    APIRouter, BackgroundTasks, Depends, File, Header, HTTPException, Query,
+    UploadFile
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import Dict
+from datetime import datetime
+from typing import Optional, Tuple
 
 from app.database import get_db
 from app.auth import get_current_user
 from app.config import redis_client
 from app.models import History
-from app.schemas import DistanceRequest, HistoryChatRequest
+from app.schemas import (
+    DistanceRequest, HistoryChatRequest, HistoryFileFormat, RouteEndpoint,
+    DistanceResponse, HistoryPage, NearbyRoutesResponse, RouteStatsResponse,
+    ImportResult, HistoryInsightsResponse, ArchivedHistoryResponse
+)
 from app.service import (
     get_coordinates, haversine_distance,
-    build_user_index, search_history,
-    build_prompt, call_llm,
+    export_history, import_history,
+    record_route_stats, get_route_stats,
+    route_location_columns, find_routes_within, find_nearest_routes,
+    search_history, call_llm,
+    get_history_index, touch_history_index, warm_history_index,
+    get_history_version, bump_history_version,
     save_memory, load_memory
 )
 from app.decorators import throttle
+from app.profiling import profile_endpoint
+from app.metrics import record_cache, track_stage
+from app.prompt import build_prompt
+from app.retrieval import RouteRow
+from app.retention import read_archived_history
 from app.config import settings
-from app.constants import MOCK_COORDS, CACHE_TTL
+from app.constants import (
+    MOCK_COORDS, KM_TO_MILES, STATS_DEFAULT_DAYS, NEARBY_MAX_RADIUS_KM,
+    HISTORY_PAGE_TTL
+)
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +48,7 @@ router = APIRouter(prefix="/routes", tags=["routes"])
 
 
 @router.post(
-    "/distance", response_model=Dict,
+    "/distance", response_model=DistanceResponse,
     summary="Calculate distance between two addresses",
     description="""
         Calculates the geographical distance between a source and destination address.
@@ -36,9 +59,11 @@ router = APIRouter(prefix="/routes", tags=["routes"])
     """,
     response_description="Distance calculation result with unit conversion"
     )
+@profile_endpoint
 @throttle(limit=10, window=60)
 async def distance_between_addresses(
     payload: DistanceRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user)
 ):
@@ -52,22 +77,43 @@ async def distance_between_addresses(
             lat2, lon2 = await get_coordinates(payload.destination)
 
         distance_km = haversine_distance(lat1, lon1, lat2, lon2)
-        distance_miles = distance_km * 0.621371
+        distance_miles = distance_km * KM_TO_MILES
 
-        # Save history
+        # Save history and fold it into the stats rollups
         try:
-            history = History(
-                source=payload.source,
-                destination=payload.destination,
-                kilometer_distance=round(distance_km, 2),
-                mile_distance=round(distance_miles, 2),
-                user_id=current_user.id
-            )
-            db.add(history)
-            db.commit()
+            route = {
+                "source": payload.source,
+                "destination": payload.destination,
+                "kilometer_distance": round(distance_km, 2),
+                "mile_distance": round(distance_miles, 2),
+                "user_id": current_user.id,
+                "created_at": datetime.utcnow(),
+                **route_location_columns((lat1, lon1), (lat2, lon2))
+            }
+            entry = History(**route)
+            db.add(entry)
+            # Assigns the id now; after the commit reading it would reload the row
+            db.flush()
+            route_id = entry.id
+            record_route_stats(db, current_user.id, [route])
+            with track_stage("db_commit"):
+                db.commit()
         except Exception as e:
             db.rollback()
             logger.warning(f"Failed to save history: {e}")
+        else:
+            # The row is saved; a Redis failure here must not skip the warmup
+            try:
+                bump_history_version(current_user.id)
+            except Exception as e:
+                logger.warning(f"History version bump failed for user {current_user.id}: {e}")
+            background_tasks.add_task(
+                warm_history_index, current_user.id,
+                new_rows=[RouteRow(
+                    route_id, route["source"], route["destination"],
+                    route["kilometer_distance"], route["created_at"]
+                )]
+            )
 
         return {
             "success": True,
@@ -85,7 +131,7 @@ async def distance_between_addresses(
 
 
 @router.get(
-    "/history",
+    "/history", response_model=HistoryPage,
     summary="Get paginated route history",
     description="""
         Retrieves paginated route history for the authenticated user.
@@ -93,6 +139,8 @@ async def distance_between_addresses(
         - Offset-based pagination
         - Sorting by most recent routes
         - Total record count
+        - Conditional requests: responses carry an `ETag` derived from the
+          user's history version; a matching `If-None-Match` returns 304
     """,
     response_description="Paginated route history list")
 def get_history(
@@ -100,108 +148,347 @@ def get_history(
     current_user=Depends(get_current_user),
     offset: int = Query(0, ge=0, description="Start index"),
     limit: int = Query(10, gt=0, le=100, description="Number of records to fetch"),
+    if_none_match: Optional[str] = Header(None),
 ):
     """
     Fetch paginated history for the current user.
+    Unchanged pages are answered from Redis without touching the database;
+    if Redis is unavailable the page is served uncached and without an ETag.
     """
     try:
-        base_query = db.query(History).filter(
-            History.user_id == current_user.id
-        )
+        version = get_history_version(current_user.id)
+    except Exception as e:
+        logger.warning(f"History version lookup failed, serving uncached: {e}")
+        version = None
 
-        total = base_query.count()
+    try:
+        headers = {}
+        page_key = None
+        if version is not None:
+            etag = f'W/"h{current_user.id}-{version}-{offset}-{limit}"'
+            headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
 
-        histories = (
-            base_query
+            if if_none_match and etag in (t.strip() for t in if_none_match.split(",")):
+                return Response(status_code=304, headers=headers)
+
+            page_key = f"history_page:{current_user.id}:{version}:{offset}:{limit}"
+            try:
+                cached_page = redis_client.get(page_key)
+            except Exception as e:
+                logger.warning(f"History page cache read failed: {e}")
+                cached_page = None
+            record_cache("history_page", bool(cached_page))
+            if cached_page:
+                return Response(cached_page, media_type="application/json", headers=headers)
+
+        # Column-only queries: no ORM hydration for listing
+        total = (
+            db.query(func.count(History.id))
+            .filter(History.user_id == current_user.id)
+            .scalar()
+        )
+
+        # Each monthly partition serves this from its (user_id, created_at)
+        # index; Postgres merges the partitions in order (Merge Append) and
+        # stops after offset + limit rows, so old partitions are rarely read
+        rows = (
+            db.query(
+                History.source,
+                History.destination,
+                History.kilometer_distance.label("distance_km"),
+                History.mile_distance.label("distance_miles"),
+            )
+            .filter(History.user_id == current_user.id)
             .order_by(History.created_at.desc())
             .offset(offset)
             .limit(limit)
             .all()
         )
-        data = [
-            {
-                "source": h.source,
-                "destination": h.destination,
-                "distance_km": h.kilometer_distance,
-                "distance_miles": h.mile_distance
-            }
-            for h in histories
-        ]
-
-        return {
+        body = orjson.dumps({
             "total": total,
-            "items": data
-        }
+            "items": [row._asdict() for row in rows]
+        })
+
+        if page_key is not None:
+            try:
+                redis_client.setex(page_key, HISTORY_PAGE_TTL, body)
+            except Exception as e:
+                logger.warning(f"Failed to cache history page: {e}")
+
+        return Response(body, media_type="application/json", headers=headers)
     except Exception as e:
         logger.exception(f"Fetching history failed: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve history")
 
 
+async def _resolve_point(
+    lat: Optional[float],
+    lon: Optional[float],
+    address: Optional[str]
+) -> Tuple[float, float]:
+    """Use explicit coordinates when given, otherwise geocode the address."""
+    if lat is not None and lon is not None:
+        return lat, lon
+    if address:
+        try:
+            return await get_coordinates(address)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+    raise HTTPException(
+        status_code=400,
+        detail="Provide either both lat and lon, or an address"
+    )
+
+
+def _nearby_items(matches) -> list:
+    return [
+        {
+            "source": h.source,
+            "destination": h.destination,
+            "distance_km": h.kilometer_distance,
+            "distance_miles": h.mile_distance,
+            "created_at": h.created_at,
+            "distance_to_point_km": round(dist, 2)
+        }
+        for dist, h in matches
+    ]
+
+
+@router.get(
+    "/nearby", response_model=NearbyRoutesResponse,
+    summary="Find past routes near a location",
+    description="""
+        Returns routes whose source (or destination) lies within
+        `radius_km` of a point, nearest first.
+        - Point given as `lat`/`lon` or as an `address` to geocode
+        - Uses stored coordinates and a geohash index, no re-geocoding
+        - Routes recorded before coordinates were stored are not included
+    """,
+    response_description="Routes within the radius")
+async def nearby_routes(
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    address: Optional[str] = Query(None, max_length=200),
+    radius_km: float = Query(10, gt=0, le=NEARBY_MAX_RADIUS_KM),
+    endpoint: RouteEndpoint = Query(RouteEndpoint.source),
+    limit: int = Query(20, gt=0, le=100),
+):
+    point = await _resolve_point(lat, lon, address)
+    try:
+        matches = await run_in_threadpool(
+            find_routes_within,
+            db, current_user.id, endpoint, *point, radius_km, limit
+        )
+        return {"success": True, "items": _nearby_items(matches)}
+    except Exception as e:
+        logger.exception(f"Nearby route lookup failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to find nearby routes")
+
+
+@router.get(
+    "/nearest", response_model=NearbyRoutesResponse,
+    summary="Find the nearest past routes to a location",
+    description="""
+        Returns the `k` routes whose source (or destination) is closest
+        to a point, nearest first.
+        - Point given as `lat`/`lon` or as an `address` to geocode
+        - Routes recorded before coordinates were stored are not included
+    """,
+    response_description="Nearest routes")
+async def nearest_routes(
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    address: Optional[str] = Query(None, max_length=200),
+    endpoint: RouteEndpoint = Query(RouteEndpoint.source),
+    k: int = Query(5, gt=0, le=50),
+):
+    point = await _resolve_point(lat, lon, address)
+    try:
+        matches = await run_in_threadpool(
+            find_nearest_routes, db, current_user.id, endpoint, *point, k
+        )
+        return {"success": True, "items": _nearby_items(matches)}
+    except Exception as e:
+        logger.exception(f"Nearest route lookup failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to find nearest routes")
+
+
+@router.get(
+    "/stats", response_model=RouteStatsResponse,
+    summary="Get route statistics",
+    description="""
+        Returns aggregate statistics for the authenticated user:
+        - Total routes, total and average kilometers
+        - Most frequent destinations
+        - Routes and kilometers per day for the last `days` days
+
+        Served entirely from precomputed rollup tables, so cost grows with
+        the number of days and destinations rather than with history size.
+    """,
+    response_description="Route statistics")
+def route_stats(
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+    days: int = Query(STATS_DEFAULT_DAYS, gt=0, le=366, description="Per-day window size"),
+):
+    try:
+        return {"success": True, **get_route_stats(db, current_user.id, days)}
+    except Exception as e:
+        logger.exception(f"Fetching route stats failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve route statistics")
+
+
+@router.get(
+    "/history/export",
+    summary="Export full route history",
+    description="""
+        Streams the authenticated user's complete route history.
+        - NDJSON (one route per line) or CSV
+        - Rows are read with a server-side cursor, so memory use is
+          constant regardless of history size
+    """,
+    response_description="Streamed history file")
+def export_route_history(
+    current_user=Depends(get_current_user),
+    fmt: HistoryFileFormat = Query(HistoryFileFormat.ndjson, alias="format"),
+):
+    media_type = "text/csv" if fmt == HistoryFileFormat.csv else "application/x-ndjson"
+    return StreamingResponse(
+        export_history(current_user.id, fmt),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="route_history.{fmt.value}"'
+        }
+    )
+
+
 @router.post(
-        "/history-insights", 
+    "/history/import", response_model=ImportResult,
+    summary="Bulk import route history",
+    description="""
+        Imports routes from an uploaded NDJSON or CSV file
+        (same columns as the export).
+        - The file is parsed incrementally and inserted in batches
+        - Records without distances are geocoded, each unique address once
+        - Invalid or ungeocodable records are skipped and counted
+    """,
+    response_description="Number of imported and skipped routes")
+async def import_route_history(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+    fmt: HistoryFileFormat = Query(HistoryFileFormat.ndjson, alias="format"),
+):
+    try:
+        result = await import_history(db, current_user.id, file.file, fmt)
+        logger.info(
+            f"History import for user {current_user.id}: "
+            f"{result['imported']} imported, {result['skipped']} skipped"
+        )
+        if result["imported"]:
+            background_tasks.add_task(warm_history_index, current_user.id)
+        return {"success": True, **result}
+
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Import file must be UTF-8 encoded")
+
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"History import failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to import history")
+
+
+@router.get(
+    "/history/archive", response_model=ArchivedHistoryResponse,
+    summary="Get archived route history",
+    description="""
+        Returns the authenticated user's routes for one archived month.
+        - Months older than the retention window are moved out of the
+          database into compressed Parquet files
+        - They are no longer part of `/history`, export, nearby lookups or
+          insights, but can be read back here
+        - `/stats` totals still include them (they come from the rollups)
+    """,
+    response_description="Archived routes for the month, newest first")
+def get_archived_history(
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+    month: str = Query(..., pattern=r"^\d{4}-(0[1-9]|1[0-2])$", description="Month as YYYY-MM"),
+):
+    try:
+        items = read_archived_history(
+            db, current_user.id, datetime.strptime(month, "%Y-%m")
+        )
+    except Exception as e:
+        logger.exception(f"Reading archived history failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve archived history")
+
+    if items is None:
+        raise HTTPException(status_code=404, detail="No archived history for this month")
+
+    return {
+        "month": month,
+        "items": [
+            {
+                "source": r["source"],
+                "destination": r["destination"],
+                "distance_km": r["kilometer_distance"],
+                "distance_miles": r["mile_distance"],
+                "created_at": r["created_at"],
+            }
+            for r in items
+        ]
+    }
+
+
+@router.post(
+        "/history-insights", response_model=HistoryInsightsResponse,
         summary="Generate AI insights from route history",
         description="""
         Uses Retrieval-Augmented Generation (RAG) to answer user questions
         based on their past route history.
 
         Workflow:
-        - Builds or retrieves FAISS vector index from Redis
+        - Retrieves the user's prebuilt FAISS index from Redis
+          (built on demand, or awaited if a warmup build is running)
         - Retrieves relevant past routes
         - Uses LLM to generate contextual answer
         - Maintains session-based chat memory
         """,
         response_description="AI-generated contextual insights")
+@profile_endpoint
 def history_insights(
     req: HistoryChatRequest,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     try:
-        cache_key = f"history_rag:{current_user.id}:{req.session_id}"
-        index, texts = None, None
-        cached_blob = redis_client.get(cache_key)
-
-        if cached_blob:
-            try:
-                index, texts = pickle.loads(cached_blob)
-            except Exception as e:
-                logger.warning(f"Cache decode failed — rebuilding index: {e}")
-                cached_blob = None
-
-        # Handle cache miss
-        if not cached_blob:
-            rows = (
-                db.query(History)
-                .filter(History.user_id == current_user.id)
-                .limit(500)
-                .all()
-            )
-
-            if not rows:
-                return {
-                    "success": True,
-                    "answer": "You don't have any route history yet.",
-                    "retrieved_context": []
-                }
+        # Index is per user and usually prebuilt by warm_history_index
+        history = get_history_index(db, current_user.id)
 
-            index, texts = build_user_index(rows)
-
-            redis_client.setex(
-                cache_key,
-                CACHE_TTL,
-                pickle.dumps((index, texts))
-            )
+        if history is None:
+            return {
+                "success": True,
+                "answer": "You don't have any route history yet.",
+                "retrieved_context": []
+            }
 
-        retrieved = search_history(req.question, index, texts, k=5)
+        retrieved_ids = search_history(req.question, history, k=5)
+        retrieved = [history.texts[i] for i in retrieved_ids]
 
         # refresh TTL on follow-up queries
-        redis_client.expire(cache_key, CACHE_TTL)
+        touch_history_index(current_user.id)
 
         # load chat memory
         memory = load_memory(current_user.id, req.session_id)
         prompt = build_prompt(
             question=req.question,
-            retrieved_routes=retrieved,
+            route_records=[history.record(i) for i in retrieved_ids],
             memory=memory
         )
         answer = call_llm(prompt)
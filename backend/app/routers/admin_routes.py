@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.auth import require_admin_token
+from app.profiling import clear_profiles, get_slowest_profiles
+from app.schemas import RequestProfilesResponse
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/admin", tags=["admin"],
+    dependencies=[Depends(require_admin_token)]
+)
+
+
+@router.get(
+    "/profiles", response_model=RequestProfilesResponse,
+    summary="Get the slowest profiled requests",
+    description="""
+        Returns the slowest requests recorded by the opt-in profiler,
+        slowest first.
+        - Requests are profiled when sampled (`PROFILING_SAMPLE_RATE`) or
+          when sent with `X-Profile: <admin token>`
+        - Each entry has a span breakdown (Redis, embedding, FAISS, LLM, ...)
+          and, with `PROFILING_CPROFILE` on, a cProfile report
+        - Requires the `X-Admin-Token` header
+    """,
+    response_description="Slowest request profiles")
+def list_profiles():
+    try:
+        return {"success": True, "items": get_slowest_profiles()}
+    except Exception as e:
+        logger.exception(f"Fetching request profiles failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve profiles")
+
+
+@router.delete(
+    "/profiles",
+    summary="Clear stored request profiles",
+    response_description="Confirmation")
+def delete_profiles():
+    try:
+        clear_profiles()
+        return {"success": True}
+    except Exception as e:
+        logger.exception(f"Clearing request profiles failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to clear profiles")
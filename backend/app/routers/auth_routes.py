@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 
 from app.database import get_db
 from app.models import User
-from app.schemas import UserCreate
+from app.schemas import UserCreate, SignupResponse, TokenResponse
 from app.auth import hash_password, verify_password, create_access_token
+from app.service import warm_history_index
 import logging
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -15,7 +16,7 @@ log = logging.getLogger(__name__)
 
 
 @router.post(
-    "/signup",
+    "/signup", response_model=SignupResponse,
     summary="Register a new user",
     description="""
         Creates a new user account.
@@ -89,7 +90,7 @@ def signup(payload: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post(
-    "/login",
+    "/login", response_model=TokenResponse,
     summary="Authenticate user and generate JWT token",
     description="""
         Authenticates a user using email and password.
@@ -97,9 +98,14 @@ def signup(payload: UserCreate, db: Session = Depends(get_db)):
         - Verifies hashed password
         - Generates JWT access token
         - Returns bearer token for protected endpoints
+        - Schedules a background warmup of the user's insights index
     """,
     response_description="JWT access token")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def login(
+    background_tasks: BackgroundTasks,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: Session = Depends(get_db)
+):
     try:
         email = form_data.username
         password = form_data.password
@@ -122,6 +128,9 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 
         token = create_access_token({"user_id": user.id})
         log.info(f"Login successful: {email}")
+
+        # Prebuild the insights index so the first question is not cold
+        background_tasks.add_task(warm_history_index, user.id, only_if_missing=True)
         return {"success": True, "access_token": token, "token_type": "bearer"}
 
     except HTTPException as e:
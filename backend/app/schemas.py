@@ -1,5 +1,9 @@
+from datetime import datetime
 from enum import Enum
-from pydantic import BaseModel, EmailStr
+from typing import List, Optional
+from pydantic import BaseModel, EmailStr, Field
+
+from app.constants import QUESTION_MAX_CHARS
 
 class UserLogin(BaseModel):
     email: EmailStr
@@ -16,11 +20,112 @@ class DistanceUnit(str, Enum):
     miles = "miles"
     both = "both"
 
+class HistoryFileFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+class RouteEndpoint(str, Enum):
+    source = "source"
+    destination = "destination"
+
 class DistanceRequest(BaseModel):
     source: str
     destination: str
     unit: DistanceUnit
 
 class HistoryChatRequest(BaseModel):
-    question: str
-    session_id:str
\ No newline at end of file
+    question: str = Field(..., min_length=1, max_length=QUESTION_MAX_CHARS)
+    session_id:str
+
+
+# Response models
+
+class SignupResponse(BaseModel):
+    success: bool
+    message: str
+    user_id: int
+
+class TokenResponse(BaseModel):
+    success: bool
+    access_token: str
+    token_type: str
+
+class DistanceResponse(BaseModel):
+    success: bool
+    source: str
+    destination: str
+    unit: DistanceUnit
+    distance_km: float
+    distance_miles: float
+
+class HistoryItem(BaseModel):
+    source: str
+    destination: str
+    distance_km: Optional[float]
+    distance_miles: Optional[float]
+
+class HistoryPage(BaseModel):
+    total: int
+    items: List[HistoryItem]
+
+class ArchivedRoute(HistoryItem):
+    created_at: datetime
+
+class ArchivedHistoryResponse(BaseModel):
+    month: str
+    items: List[ArchivedRoute]
+
+class NearbyRoute(HistoryItem):
+    created_at: Optional[datetime]
+    distance_to_point_km: float
+
+class NearbyRoutesResponse(BaseModel):
+    success: bool
+    items: List[NearbyRoute]
+
+class DestinationStats(BaseModel):
+    destination: str
+    routes: int
+    total_km: float
+
+class DayStats(BaseModel):
+    day: str
+    routes: int
+    total_km: float
+
+class RouteStatsResponse(BaseModel):
+    success: bool
+    total_routes: int
+    total_km: float
+    average_km: float
+    top_destinations: List[DestinationStats]
+    per_day: List[DayStats]
+
+class ImportResult(BaseModel):
+    success: bool
+    imported: int
+    skipped: int
+
+class HistoryInsightsResponse(BaseModel):
+    success: bool
+    answer: str
+    retrieved_context: List[str]
+
+class ProfileSpan(BaseModel):
+    name: str
+    start_ms: float
+    duration_ms: float
+
+class RequestProfileItem(BaseModel):
+    id: str
+    method: str
+    path: str
+    status: int
+    started_at: datetime
+    duration_ms: float
+    spans: List[ProfileSpan]
+    cprofile: Optional[str]
+
+class RequestProfilesResponse(BaseModel):
+    success: bool
+    items: List[RequestProfileItem]
@@ -2,10 +2,17 @@
 Service utilities for route distance, history, and LLM-based insights.
 """
 
+import csv
+import io
 import json
 import math
-from datetime import datetime
-from typing import List, Tuple, Dict
+import mmap
+import os
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
 
 import faiss
 import httpx
@@ -13,15 +20,61 @@ import numpy as np
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_groq import ChatGroq
 
+from sqlalchemy import func, insert, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
 from app.config import settings, redis_client
-from app.constants import HEADERS, MAX_MEMORY, NOMINATIM_URL
-from app.database import model
+from app.constants import (
+    HEADERS, MAX_MEMORY, MOCK_COORDS, KM_TO_MILES, EARTH_RADIUS_KM, WARMUP_LOCK_TTL,
+    WARMUP_WAIT_TIMEOUT, WARMUP_POLL_INTERVAL, HISTORY_INDEX_TTL,
+    EXPORT_BATCH_SIZE, IMPORT_BATCH_SIZE, EXPORT_FIELDS,
+    STATS_TOP_DESTINATIONS, GEOHASH_PRECISION,
+    EMBED_BATCH_SIZE, HNSW_M, HNSW_EF_CONSTRUCTION, RETRIEVAL_OVERSAMPLE,
+    RAG_APPEND_HEADROOM
+)
+from app import geohash
+from app.database import model, SessionLocal
+from app.index_format import content_id, decode_history_index, encode_history_index
+from app.retrieval import (
+    HistoryIndex, RouteRow, build_postings, dense_ranking, filter_mask,
+    lexical_ranking, parse_question_filters, reciprocal_rank_fusion
+)
+from app.models import History, DailyRouteStats, DestinationRouteStats
+from app.prompt import SYSTEM_PROMPT
+from app.schemas import HistoryFileFormat, RouteEndpoint
 from app.chat_memory import chat_memory_store
+from app.metrics import (
+    EMBEDDING_BATCH_SIZE, record_cache, track_stage, track_upstream
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+# Shared per-process client so Nominatim connections are reused;
+# created lazily so each forked worker gets its own.
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide async HTTP client."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(timeout=10, headers=HEADERS)
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client (called on application shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
 async def get_coordinates(address: str) -> Tuple[float, float]:
     """
     Fetch latitude and longitude for an address using Nominatim API.
@@ -32,15 +85,17 @@ async def get_coordinates(address: str) -> Tuple[float, float]:
         Tuple[float, float]: Latitude and Longitude.
     """
     cache_key = f"geo:{address.lower()}"
-    cached = redis_client.get(cache_key)
+    with track_stage("redis_get"):
+        cached = redis_client.get(cache_key)
+    record_cache("geo", bool(cached))
     if cached:
         return tuple(json.loads(cached))
 
     params = {"q": address, "format": "json", "addressdetails": 1}
 
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.get(NOMINATIM_URL + "search", params=params, headers=HEADERS)
+        with track_upstream("nominatim"):
+            response = await get_http_client().get(settings.nominatim_url + "search", params=params)
             response.raise_for_status()
     except httpx.HTTPStatusError as e:
         logger.error(f"Nominatim API returned HTTP {e.response.status_code} for '{address}'")
@@ -56,7 +111,8 @@ async def get_coordinates(address: str) -> Tuple[float, float]:
     coords = (float(data[0]["lat"]), float(data[0]["lon"]))
 
     try:
-        redis_client.setex(cache_key, 86400, json.dumps(coords))
+        with track_stage("redis_set"):
+            redis_client.setex(cache_key, 86400, json.dumps(coords))
     except Exception as e:
         logger.warning(f"Failed to cache coordinates for '{address}': {e}")
 
@@ -77,7 +133,597 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     dlon = lon2 - lon1
     a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
     c = 2 * math.asin(math.sqrt(a))
-    return 6371 * c
+    return EARTH_RADIUS_KM * c
+
+
+def _point_columns(prefix: str, coords: Optional[Tuple[float, float]]) -> Dict:
+    if coords is None:
+        return {f"{prefix}_lat": None, f"{prefix}_lon": None, f"{prefix}_geohash": None}
+    lat, lon = coords
+    return {
+        f"{prefix}_lat": lat,
+        f"{prefix}_lon": lon,
+        f"{prefix}_geohash": geohash.encode(lat, lon, GEOHASH_PRECISION),
+    }
+
+
+def route_location_columns(
+    source: Optional[Tuple[float, float]],
+    destination: Optional[Tuple[float, float]]
+) -> Dict:
+    """
+    Build the History coordinate and geohash columns for a route.
+    Either endpoint may be None when its coordinates are unknown.
+    """
+    return {
+        **_point_columns("source", source),
+        **_point_columns("destination", destination),
+    }
+
+
+def _endpoint_columns(endpoint: RouteEndpoint):
+    if endpoint == RouteEndpoint.destination:
+        return History.destination_lat, History.destination_lon, History.destination_geohash
+    return History.source_lat, History.source_lon, History.source_geohash
+
+
+def _in_cells(hash_col, cells: List[str]):
+    return or_(*[hash_col.like(f"{cell}%") for cell in cells])
+
+
+def _located_routes(db: Session, user_id: int, endpoint: RouteEndpoint):
+    """Column-only query over a user's routes with a known endpoint location."""
+    lat_col, lon_col, _ = _endpoint_columns(endpoint)
+    return db.query(
+        History.source,
+        History.destination,
+        History.kilometer_distance,
+        History.mile_distance,
+        History.created_at,
+        lat_col,
+        lon_col,
+    ).filter(History.user_id == user_id, lat_col.isnot(None))
+
+
+def _routes_in_cells(
+    db: Session,
+    user_id: int,
+    endpoint: RouteEndpoint,
+    cells: List[str],
+    exclude_cells: Optional[List[str]] = None
+) -> List:
+    """
+    Fetch a user's routes whose endpoint geohash falls in any of the cells,
+    leaving out those in exclude_cells (already fetched by the caller).
+    """
+    _, _, hash_col = _endpoint_columns(endpoint)
+    query = _located_routes(db, user_id, endpoint).filter(_in_cells(hash_col, cells))
+    if exclude_cells:
+        query = query.filter(~_in_cells(hash_col, exclude_cells))
+    return query.all()
+
+
+def _count_in_cells(
+    db: Session,
+    user_id: int,
+    endpoint: RouteEndpoint,
+    cells: List[str]
+) -> int:
+    """Count a user's routes in the cells (served from the geohash index)."""
+    _, _, hash_col = _endpoint_columns(endpoint)
+    return (
+        db.query(func.count())
+        .select_from(History)
+        .filter(History.user_id == user_id, _in_cells(hash_col, cells))
+        .scalar()
+    )
+
+
+def _with_distance_to(
+    rows: List,
+    endpoint: RouteEndpoint,
+    lat: float,
+    lon: float
+) -> List[Tuple[float, object]]:
+    lat_col, lon_col, _ = _endpoint_columns(endpoint)
+    return [
+        (
+            haversine_distance(
+                lat, lon,
+                getattr(row, lat_col.key), getattr(row, lon_col.key)
+            ),
+            row
+        )
+        for row in rows
+    ]
+
+
+def find_routes_within(
+    db: Session,
+    user_id: int,
+    endpoint: RouteEndpoint,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    limit: int
+) -> List[Tuple[float, object]]:
+    """
+    Find routes whose source or destination lies within radius_km of a point.
+
+    The geohash neighbourhood that covers the radius narrows candidates with
+    indexed prefix scans; exact haversine distance then filters them. When
+    no neighbourhood covers the radius (near the poles), all of the user's
+    located routes are checked.
+
+    Returns:
+        List[Tuple[float, Row]]: (distance to point in km, row), nearest first.
+    """
+    precision = geohash.precision_for_radius(radius_km, lat, GEOHASH_PRECISION)
+    if precision:
+        rows = _routes_in_cells(
+            db, user_id, endpoint, geohash.neighbourhood(lat, lon, precision)
+        )
+    else:
+        rows = _located_routes(db, user_id, endpoint).all()
+
+    matches = sorted(
+        (c for c in _with_distance_to(rows, endpoint, lat, lon) if c[0] <= radius_km),
+        key=lambda c: c[0]
+    )
+    return matches[:limit]
+
+
+def find_nearest_routes(
+    db: Session,
+    user_id: int,
+    endpoint: RouteEndpoint,
+    lat: float,
+    lon: float,
+    k: int
+) -> List[Tuple[float, object]]:
+    """
+    Find the k past routes whose source or destination is nearest to a point.
+
+    The finest geohash neighbourhood holding at least k routes is found by
+    binary search over index-only counts, and only its rows are fetched.
+    If their k-th distance exceeds the radius that neighbourhood is
+    guaranteed to cover, the rows of the neighbourhood covering that
+    distance are added once (excluding cells already fetched), which makes
+    the result exact. All located routes are scanned only when no
+    neighbourhood suffices (sparse history, or near the poles).
+
+    Returns:
+        List[Tuple[float, Row]]: (distance to point in km, row), nearest first.
+    """
+    def count(precision: int) -> int:
+        return _count_in_cells(
+            db, user_id, endpoint, geohash.neighbourhood(lat, lon, precision)
+        )
+
+    def nearest(rows: List) -> List[Tuple[float, object]]:
+        return sorted(_with_distance_to(rows, endpoint, lat, lon), key=lambda c: c[0])
+
+    if count(1) < k:
+        return nearest(_located_routes(db, user_id, endpoint).all())[:k]
+
+    # Counts only grow as cells get coarser
+    low, high = 1, GEOHASH_PRECISION
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count(mid) >= k:
+            low = mid
+        else:
+            high = mid - 1
+
+    cells = geohash.neighbourhood(lat, lon, low)
+    candidates = nearest(_routes_in_cells(db, user_id, endpoint, cells))
+    kth_distance = candidates[k - 1][0]
+    if kth_distance <= geohash.coverage_km(low, lat):
+        return candidates[:k]
+
+    precision = geohash.precision_for_radius(kth_distance, lat, low - 1)
+    if not precision:
+        return nearest(_located_routes(db, user_id, endpoint).all())[:k]
+    extra = _routes_in_cells(
+        db, user_id, endpoint, geohash.neighbourhood(lat, lon, precision), cells
+    )
+    return sorted(
+        candidates + _with_distance_to(extra, endpoint, lat, lon),
+        key=lambda c: c[0]
+    )[:k]
+
+
+def _upsert_rollup(db: Session, table, key: str, buckets: Dict) -> None:
+    """Add aggregated counts to a rollup table, creating missing rows."""
+    upsert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else pg_insert
+    stmt = upsert(table).values([
+        {"user_id": user_id, key: value, "route_count": count, "total_km": km}
+        for (user_id, value), (count, km) in buckets.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", key],
+        set_={
+            "route_count": table.route_count + stmt.excluded.route_count,
+            "total_km": table.total_km + stmt.excluded.total_km,
+        }
+    )
+    db.execute(stmt)
+
+
+def record_route_stats(db: Session, user_id: int, routes: List[Dict]) -> None:
+    """
+    Fold newly inserted routes into the per-day and per-destination rollups.
+    Runs in the caller's transaction, so rollups commit with the history rows.
+
+    Args:
+        db (Session): Database session.
+        user_id (int): Owner of the routes.
+        routes (List[Dict]): History column mappings that were inserted.
+    """
+    daily: Dict[Tuple[int, date], List] = {}
+    destinations: Dict[Tuple[int, str], List] = {}
+
+    for route in routes:
+        km = route.get("kilometer_distance") or 0.0
+        for buckets, key in (
+            (daily, (user_id, route["created_at"].date())),
+            (destinations, (user_id, route["destination"])),
+        ):
+            bucket = buckets.setdefault(key, [0, 0.0])
+            bucket[0] += 1
+            bucket[1] += km
+
+    if daily:
+        _upsert_rollup(db, DailyRouteStats, "day", daily)
+        _upsert_rollup(db, DestinationRouteStats, "destination", destinations)
+
+
+def get_route_stats(db: Session, user_id: int, days: int) -> Dict:
+    """
+    Read route statistics for a user from the rollup tables only.
+
+    Args:
+        db (Session): Database session.
+        user_id (int): User to summarize.
+        days (int): Size of the per-day window, ending today.
+    Returns:
+        Dict: Totals, top destinations and per-day kilometers.
+    """
+    total_routes, total_km = (
+        db.query(
+            func.coalesce(func.sum(DailyRouteStats.route_count), 0),
+            func.coalesce(func.sum(DailyRouteStats.total_km), 0.0),
+        )
+        .filter(DailyRouteStats.user_id == user_id)
+        .one()
+    )
+
+    top_destinations = (
+        db.query(
+            DestinationRouteStats.destination,
+            DestinationRouteStats.route_count,
+            DestinationRouteStats.total_km,
+        )
+        .filter(DestinationRouteStats.user_id == user_id)
+        .order_by(DestinationRouteStats.route_count.desc())
+        .limit(STATS_TOP_DESTINATIONS)
+        .all()
+    )
+
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    per_day = (
+        db.query(
+            DailyRouteStats.day,
+            DailyRouteStats.route_count,
+            DailyRouteStats.total_km,
+        )
+        .filter(
+            DailyRouteStats.user_id == user_id,
+            DailyRouteStats.day >= since
+        )
+        .order_by(DailyRouteStats.day)
+        .all()
+    )
+
+    return {
+        "total_routes": total_routes,
+        "total_km": round(total_km, 2),
+        "average_km": round(total_km / total_routes, 2) if total_routes else 0.0,
+        "top_destinations": [
+            {
+                "destination": d.destination,
+                "routes": d.route_count,
+                "total_km": round(d.total_km, 2)
+            }
+            for d in top_destinations
+        ],
+        "per_day": [
+            {
+                "day": d.day.isoformat(),
+                "routes": d.route_count,
+                "total_km": round(d.total_km, 2)
+            }
+            for d in per_day
+        ],
+    }
+
+
+def export_history(user_id: int, fmt: HistoryFileFormat) -> Iterator[str]:
+    """
+    Stream a user's full route history as NDJSON or CSV.
+
+    Rows are read through a server-side cursor (``yield_per``) and written
+    out one batch at a time, so memory stays constant regardless of how
+    many routes the user has. The generator owns its session because it
+    outlives the request handler that returns it.
+
+    Args:
+        user_id (int): Owner of the history.
+        fmt (HistoryFileFormat): Output format.
+    Returns:
+        Iterator[str]: Chunks of the encoded file.
+    """
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(
+                History.source,
+                History.destination,
+                History.kilometer_distance,
+                History.mile_distance,
+                History.created_at,
+                History.source_lat,
+                History.source_lon,
+                History.destination_lat,
+                History.destination_lon,
+            )
+            .filter(History.user_id == user_id)
+            .order_by(History.created_at, History.id)
+            .yield_per(EXPORT_BATCH_SIZE)
+        )
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == HistoryFileFormat.csv:
+            writer.writerow(EXPORT_FIELDS)
+
+        for i, row in enumerate(rows, start=1):
+            created_at = row.created_at.isoformat() if row.created_at else None
+            values = [
+                row.source, row.destination,
+                row.kilometer_distance, row.mile_distance, created_at,
+                row.source_lat, row.source_lon,
+                row.destination_lat, row.destination_lon
+            ]
+            if fmt == HistoryFileFormat.csv:
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, values))) + "\n")
+
+            if i % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+
+def iter_import_records(stream: BinaryIO, fmt: HistoryFileFormat) -> Iterator[Dict]:
+    """
+    Lazily decode records from an uploaded NDJSON or CSV file.
+    Undecodable NDJSON lines are yielded as empty dicts so the caller
+    can count them as skipped.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    try:
+        if fmt == HistoryFileFormat.csv:
+            yield from csv.DictReader(text)
+            return
+
+        for line in text:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = {}
+            yield record if isinstance(record, dict) else {}
+    finally:
+        # Hand the underlying upload stream back to its owner.
+        text.detach()
+
+
+def _optional_float(value) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    return float(value)
+
+
+def _optional_point(raw: Dict, prefix: str) -> Optional[Tuple[float, float]]:
+    lat = _optional_float(raw.get(f"{prefix}_lat"))
+    lon = _optional_float(raw.get(f"{prefix}_lon"))
+    if lat is None or lon is None:
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"Invalid {prefix} coordinates")
+    return lat, lon
+
+
+def _required_text(value) -> str:
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise TypeError("Expected a string")
+    return value.strip()
+
+
+def parse_import_record(raw: Dict) -> Optional[Dict]:
+    """
+    Validate a raw import record.
+    Returns:
+        Optional[Dict]: Normalized record, or None if the record is invalid.
+    """
+    try:
+        source = _required_text(raw.get("source"))
+        destination = _required_text(raw.get("destination"))
+        if not source or not destination or len(source) > 200 or len(destination) > 200:
+            return None
+
+        distance_km = _optional_float(raw.get("distance_km"))
+        distance_miles = _optional_float(raw.get("distance_miles"))
+        created_at = raw.get("created_at")
+        created_at = datetime.fromisoformat(created_at) if created_at else None
+        source_coords = _optional_point(raw, "source")
+        destination_coords = _optional_point(raw, "destination")
+    except (TypeError, ValueError):
+        return None
+
+    return {
+        "source": source,
+        "destination": destination,
+        "distance_km": distance_km,
+        "distance_miles": distance_miles,
+        "created_at": created_at,
+        "source_coords": source_coords,
+        "destination_coords": destination_coords,
+    }
+
+
+def _read_import_batch(records: Iterator[Dict]) -> Tuple[List[Dict], int, bool]:
+    """
+    Parse up to IMPORT_BATCH_SIZE valid records from the upload.
+    Returns:
+        Tuple[List[Dict], int, bool]: Valid records, number of invalid
+            records skipped, and whether the file is exhausted.
+    """
+    batch: List[Dict] = []
+    skipped = 0
+    for raw in records:
+        record = parse_import_record(raw)
+        if record is None:
+            skipped += 1
+            continue
+        batch.append(record)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            return batch, skipped, False
+    return batch, skipped, True
+
+
+async def _geocode_once(
+    address: str,
+    coords_cache: Dict[str, Optional[Tuple[float, float]]]
+) -> Optional[Tuple[float, float]]:
+    """Geocode an address at most once per import."""
+    if address not in coords_cache:
+        try:
+            if settings.debug:
+                coords_cache[address] = MOCK_COORDS.get("source")
+            else:
+                coords_cache[address] = await get_coordinates(address)
+        except ValueError as e:
+            logger.warning(f"Import geocoding failed for '{address}': {e}")
+            coords_cache[address] = None
+    return coords_cache[address]
+
+
+async def _geocode_import_batch(
+    batch: List[Dict],
+    coords_cache: Dict[str, Optional[Tuple[float, float]]]
+) -> None:
+    """Fill in missing coordinates for records that have no distance."""
+    for record in batch:
+        if record["distance_km"] is not None:
+            continue
+        if record["source_coords"] is None:
+            record["source_coords"] = await _geocode_once(record["source"], coords_cache)
+        if record["destination_coords"] is None:
+            record["destination_coords"] = await _geocode_once(
+                record["destination"], coords_cache
+            )
+
+
+def _insert_import_batch(db: Session, user_id: int, batch: List[Dict]) -> int:
+    """Resolve distances for a geocoded batch and insert it in one statement."""
+    mappings = []
+    for record in batch:
+        src, dst = record["source_coords"], record["destination_coords"]
+        distance_km = record["distance_km"]
+        if distance_km is None:
+            if src is None or dst is None:
+                continue
+            distance_km = haversine_distance(*src, *dst)
+
+        distance_miles = record["distance_miles"]
+        if distance_miles is None:
+            distance_miles = distance_km * KM_TO_MILES
+
+        mappings.append({
+            "source": record["source"],
+            "destination": record["destination"],
+            "kilometer_distance": round(distance_km, 2),
+            "mile_distance": round(distance_miles, 2),
+            "user_id": user_id,
+            "created_at": record["created_at"] or datetime.utcnow(),
+            **route_location_columns(src, dst),
+        })
+
+    if mappings:
+        db.execute(insert(History), mappings)
+        record_route_stats(db, user_id, mappings)
+        with track_stage("db_commit"):
+            db.commit()
+        # Per batch: a later failure must not leave stale pages and ETags
+        try:
+            bump_history_version(user_id)
+        except Exception as e:
+            logger.warning(f"History version bump failed for user {user_id}: {e}")
+    return len(mappings)
+
+
+async def import_history(
+    db: Session,
+    user_id: int,
+    stream: BinaryIO,
+    fmt: HistoryFileFormat
+) -> Dict[str, int]:
+    """
+    Import route history from an uploaded file.
+
+    The file is parsed incrementally and inserted in batches of
+    IMPORT_BATCH_SIZE. Parsing and inserts run in the threadpool, so only
+    geocoding is awaited on the event loop. Records without a distance are
+    geocoded, with each unique address looked up only once for the whole
+    import.
+
+    Args:
+        db (Session): Database session.
+        user_id (int): Owner of the imported routes.
+        stream (BinaryIO): Uploaded file object.
+        fmt (HistoryFileFormat): Input format.
+    Returns:
+        Dict[str, int]: Number of imported and skipped records.
+    """
+    coords_cache: Dict[str, Optional[Tuple[float, float]]] = {}
+    imported, skipped = 0, 0
+    records = iter_import_records(stream, fmt)
+
+    done = False
+    while not done:
+        batch, invalid, done = await run_in_threadpool(_read_import_batch, records)
+        skipped += invalid
+        if not batch:
+            continue
+
+        await _geocode_import_batch(batch, coords_cache)
+        inserted = await run_in_threadpool(_insert_import_batch, db, user_id, batch)
+        imported += inserted
+        skipped += len(batch) - inserted
+
+    return {"imported": imported, "skipped": skipped}
 
 
 def history_to_text(row) -> str:
@@ -88,100 +734,552 @@ def history_to_text(row) -> str:
     )
 
 
-def build_user_index(rows: List):
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Encode texts as L2-normalized float32 vectors (cosine via inner product)."""
+    EMBEDDING_BATCH_SIZE.observe(len(texts))
+    with track_stage("embed"):
+        vectors = model.encode(
+            texts, batch_size=EMBED_BATCH_SIZE, normalize_embeddings=True
+        )
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def build_vector_index(vectors: np.ndarray) -> faiss.Index:
     """
-    Build a FAISS index from user history.
+    Build an inner-product FAISS index sized to the number of vectors.
+
+    Small sets use exact flat search. Above ``rag_flat_max_rows`` an
+    approximate index is used: HNSW (default) or IVF, tuned through
+    ``rag_hnsw_ef_search`` / ``rag_ivf_nprobe``.
+
     Args:
-        rows (List): List of History model rows.
+        vectors (np.ndarray): L2-normalized float32 matrix.
     Returns:
-        FAISS index and original texts.
+        faiss.Index: Populated index.
     """
-    texts = [history_to_text(r) for r in rows]
-    vectors = model.encode(texts)
-    dim = vectors.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(np.array(vectors))
-    return index, texts
+    n, dim = vectors.shape
+    if n <= settings.rag_flat_max_rows:
+        index = faiss.IndexFlatIP(dim)
+    elif settings.rag_ann_index == "ivf":
+        nlist = max(1, int(math.sqrt(n)))
+        index = faiss.IndexIVFFlat(
+            faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT
+        )
+        index.train(vectors)
+        # Lets selective filters reconstruct their rows (see dense_ranking)
+        index.make_direct_map()
+    else:
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.add(vectors)
+    return index
 
 
-def search_history(question: str, index: faiss.IndexFlatL2, texts: List[str], k: int = 5) -> List[str]:
+def search_parameters(index: faiss.Index) -> faiss.SearchParameters:
+    """Per-query FAISS parameters carrying the configured recall/latency knobs."""
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=settings.rag_hnsw_ef_search)
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=settings.rag_ivf_nprobe)
+    return faiss.SearchParameters()
+
+
+def build_user_index(rows: List) -> HistoryIndex:
+    """
+    Build the hybrid retrieval index from user history.
+    Args:
+        rows (List): History rows (ORM objects or column tuples) with
+            id, source, destination, kilometer_distance and created_at.
+    Returns:
+        HistoryIndex: Vectors or FAISS index, texts, row metadata and
+            place postings.
+    """
+    with track_stage("build_user_index"):
+        texts = [history_to_text(r) for r in rows]
+        vectors = embed_texts(texts)
+        # Exact search runs directly on the vectors, so only approximate
+        # indexes need a FAISS object (and its serialized form in the cache)
+        index = None
+        if len(rows) > settings.rag_flat_max_rows:
+            index = build_vector_index(vectors)
+            vectors = vectors[:0]
+        history = HistoryIndex(
+            index=index,
+            vectors=vectors,
+            texts=texts,
+            sources=[r.source for r in rows],
+            destinations=[r.destination for r in rows],
+            created_at=np.array(
+                [r.created_at or np.datetime64("NaT") for r in rows],
+                dtype="datetime64[s]"
+            ),
+            distance_km=np.array(
+                [np.nan if r.kilometer_distance is None else r.kilometer_distance for r in rows],
+                dtype=np.float32
+            ),
+            row_ids=np.array([r.id for r in rows], dtype=np.int64),
+            postings=build_postings(rows),
+        )
+    return history
+
+
+def search_history(question: str, history: HistoryIndex, k: int = 5) -> List[int]:
     """
-    Retrieve most relevant history entries from FAISS index.
+    Retrieve most relevant history entries with hybrid search.
+
+    Date and distance constraints in the question pre-filter rows, place
+    names are matched lexically, and the lexical and FAISS rankings are
+    combined with reciprocal rank fusion.
 
     Args:
         question (str): User question.
-        index (IndexFlatL2): FAISS index.
-        texts (List[str]): Original texts.
+        history (HistoryIndex): Index built by build_user_index.
         k (int): Top-k results.
 
     Returns:
-        List[str]: Retrieved history strings.
+        List[int]: Row ids of the retrieved routes, best match first.
     """
-    q_vec = model.encode([question])
-    D, I = index.search(np.array(q_vec), k)
-    return [texts[i] for i in I[0]]
+    with track_stage("search_history"):
+        mask = filter_mask(history, parse_question_filters(question))
+        limit = k * RETRIEVAL_OVERSAMPLE
+        query_vector = embed_texts([question])
+        with track_stage("faiss_search"):
+            dense = dense_ranking(
+                history, query_vector, mask, limit,
+                search_parameters(history.index), settings.rag_flat_max_rows
+            )
+        lexical = lexical_ranking(history, question, mask, limit)
+        ranked = reciprocal_rank_fusion([lexical, dense], k)
+    return ranked
 
 
-def build_prompt(
-    question: str,
-    retrieved_routes: List[str],
-    memory: List[Dict]
-) -> str:
+def get_history_version(user_id: int) -> int:
     """
-    Build prompts for LLM call
+    Current version of a user's history, bumped on every write.
+    A missing key is seeded from the clock rather than 0, so versions (and
+    the ETags built from them) never repeat after Redis loses the key.
     """
+    key = f"history_version:{user_id}"
+    version = redis_client.get(key)
+    if version is None:
+        redis_client.set(key, time.time_ns() // 1000, nx=True)
+        version = redis_client.get(key)
+    return int(version)
 
-    # keep only recent turns → token control
-    memory = memory[-6:]
 
-    mem_block = "\n".join(
-        f"{m['role']}: {m['content']}"
-        for m in memory
-    )
+def bump_history_version(user_id: int) -> None:
+    """Invalidate cached history pages and ETags for a user."""
+    key = f"history_version:{user_id}"
+    if not redis_client.exists(key):
+        get_history_version(user_id)
+    redis_client.incr(key)
+
+
+def history_index_key(user_id: int) -> str:
+    """Redis key of a user's cached retrieval index (shared by all sessions)."""
+    return f"history_rag:{user_id}"
+
+
+def history_index_id_key(user_id: int) -> str:
+    """Redis key of the content id of a user's cached retrieval index."""
+    return f"history_rag_id:{user_id}"
 
-    ctx_block = "\n".join(retrieved_routes)
 
+def touch_history_index(user_id: int) -> None:
+    """Extend the cache TTL of a user's retrieval index."""
+    pipe = redis_client.pipeline()
+    pipe.expire(history_index_key(user_id), HISTORY_INDEX_TTL)
+    pipe.expire(history_index_id_key(user_id), HISTORY_INDEX_TTL)
+    pipe.execute()
+
+
+def drop_history_index(user_id: int) -> None:
+    """Remove a user's cached retrieval index so the next use rebuilds it."""
+    redis_client.delete(history_index_key(user_id), history_index_id_key(user_id))
+
+
+def _local_index_path(user_id: int, cid: bytes) -> Path:
+    return Path(settings.rag_local_cache_dir) / f"{user_id}-{cid.hex()}.rhix"
+
+
+def _map_local_index(path: Path) -> mmap.mmap:
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # The modification time doubles as last use for eviction
+    os.utime(path)
+    return mapped
+
+
+def _evict_local_indexes(keep: Path) -> None:
+    """
+    Trim the local index cache: files unused for HISTORY_INDEX_TTL (their Redis id
+    has expired by then) go first, then the least recently used ones until
+    the directory fits in ``settings.rag_local_cache_max_bytes``.
+    """
+    now = time.time()
+    files = []
+    for path in keep.parent.glob("*.rhix"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        if path != keep and now - stat.st_mtime > HISTORY_INDEX_TTL:
+            path.unlink(missing_ok=True)
+        else:
+            files.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= settings.rag_local_cache_max_bytes:
+            break
+        if path != keep:
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def _save_local_index(user_id: int, blob: bytes) -> mmap.mmap:
+    """
+    Write a blob fetched from Redis to the local cache and map it.
+    Older versions of the user's index are removed and the cache is
+    trimmed (see _evict_local_indexes); workers still mapping removed
+    files keep their pages until they let go.
+    """
+    path = _local_index_path(user_id, content_id(blob))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Unique per call: threadpool threads of one worker may save concurrently
+    tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+    tmp_path.write_bytes(blob)
+    os.replace(tmp_path, path)
+    for old in path.parent.glob(f"{user_id}-*.rhix"):
+        if old != path:
+            old.unlink(missing_ok=True)
+    _evict_local_indexes(path)
+    return _map_local_index(path)
+
+
+def load_cached_history_index(user_id: int) -> Optional[HistoryIndex]:
+    """
+    Return the cached retrieval index, or None on a miss or undecodable blob.
+
+    The blob is decoded in place (see app.index_format). With
+    ``rag_local_cache_dir`` set it is also kept on local disk under its
+    content id and mmapped, so follow-up questions only read the small id
+    key from Redis and share the file's pages across workers.
+    """
+    blob = None
+    if settings.rag_local_cache_dir:
+        with track_stage("redis_get"):
+            cid = redis_client.get(history_index_id_key(user_id))
+        if cid:
+            try:
+                blob = _map_local_index(_local_index_path(user_id, cid))
+            except (OSError, ValueError):
+                blob = None
+        record_cache("history_rag_local", blob is not None)
+
+    if blob is None:
+        with track_stage("redis_get"):
+            blob = redis_client.get(history_index_key(user_id))
+        record_cache("history_rag", bool(blob))
+        if not blob:
+            return None
+        if settings.rag_local_cache_dir:
+            try:
+                blob = _save_local_index(user_id, blob)
+            except Exception as e:
+                logger.warning(f"Local index cache write failed: {e}")
+
+    try:
+        with track_stage("index_deserialize"):
+            return decode_history_index(blob)
+    except Exception as e:
+        logger.warning(f"Cache decode failed — rebuilding index: {e}")
+        return None
+
+
+def month_floor(value: datetime) -> datetime:
+    """Start of the month containing ``value`` (a route_history partition bound)."""
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    """Shift a month start by a (possibly negative) number of months."""
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def fetch_recent_history(db: Session, user_id: int, limit: int) -> List:
+    """
+    Fetch a user's newest routes for indexing.
+
+    A single ordered, limited query: each route_history partition serves
+    it from its (user_id, created_at) index and Postgres merges them in
+    order (Merge Append), stopping after ``limit`` rows, so older
+    partitions are barely touched for users with enough recent history.
+
+    Args:
+        db (Session): Database session.
+        user_id (int): Owner of the history.
+        limit (int): Maximum number of rows.
+    Returns:
+        List: Column rows (id, source, destination, kilometer_distance,
+            created_at), newest first.
+    """
     return (
-        "You are a route history assistant.\n"
-        "Answer ONLY using provided route records.\n"
-        "If data missing — say you don't know.\n"
-        "Keep answers under 3 sentences.\n"
-        "Do not explain reasoning.\n\n"
-        "If data is insufficient, say so\n"
-
-        f"Conversation:\n{mem_block}\n\n"
-        f"Route records:\n{ctx_block}\n\n"
-        f"Answer ONLY using this data.\n"
-        "If unsure, say you don't know.\n\n"
-        f"Question:\n{question}"
+        db.query(
+            History.id,
+            History.source,
+            History.destination,
+            History.kilometer_distance,
+            History.created_at,
+        )
+        .filter(History.user_id == user_id)
+        .order_by(History.created_at.desc())
+        .limit(limit)
+        .all()
     )
 
 
+def store_history_index(user_id: int, history: HistoryIndex) -> None:
+    """Encode a retrieval index and cache it for all workers."""
+    with track_stage("index_serialize"):
+        blob = encode_history_index(history)
+    with track_stage("redis_set"):
+        pipe = redis_client.pipeline()
+        pipe.setex(history_index_key(user_id), HISTORY_INDEX_TTL, blob)
+        pipe.setex(history_index_id_key(user_id), HISTORY_INDEX_TTL, content_id(blob))
+        pipe.execute()
+
+
+def refresh_history_index(db: Session, user_id: int) -> Optional[HistoryIndex]:
+    """
+    Rebuild a user's retrieval index from the database and cache it.
+    Returns:
+        Optional[HistoryIndex]: The new index, or None if the user has no history.
+    """
+    with track_stage("history_fetch"):
+        rows = fetch_recent_history(db, user_id, settings.rag_max_rows)
+
+    if not rows:
+        drop_history_index(user_id)
+        return None
+
+    history = build_user_index(rows)
+    store_history_index(user_id, history)
+    return history
+
+
+def append_to_index(history: HistoryIndex, rows: List[RouteRow]) -> Optional[HistoryIndex]:
+    """
+    Extend a cached index with new rows, embedding only those rows.
+
+    Exact-search indexes get the new vectors appended. HNSW and IVF indexes
+    are copied and extended with ``add``, since the decoded index may be
+    shared through the per-worker ANN cache.
+
+    Returns:
+        Optional[HistoryIndex]: The extended index (the same one if it already
+            holds the rows), or None when a full rebuild is needed instead: an
+            exact index would pass rag_flat_max_rows, an approximate one would
+            pass rag_max_rows by more than RAG_APPEND_HEADROOM, or an IVF
+            index outgrew the lists it was trained with.
+    """
+    # Rows committed before the cached index was built are already in it
+    known = np.isin([r.id for r in rows], history.row_ids)
+    rows = [r for r, present in zip(rows, known) if not present]
+    if not rows:
+        return history
+
+    n = len(history.texts)
+    total = n + len(rows)
+    if history.index is None:
+        if total > settings.rag_flat_max_rows or total > settings.rag_max_rows:
+            return None
+    elif (
+        total > settings.rag_max_rows * RAG_APPEND_HEADROOM
+        # A rebuild would pick twice as many IVF lists (nlist ~ sqrt(rows))
+        or isinstance(history.index, faiss.IndexIVF)
+        and total > (2 * history.index.nlist) ** 2
+    ):
+        return None
+
+    added = build_user_index(rows)
+    index = None
+    vectors = np.concatenate([history.vectors, added.vectors])
+    if history.index is not None:
+        with track_stage("index_append"):
+            index = faiss.clone_index(history.index)
+            index.add(added.vectors)
+        vectors = history.vectors
+
+    postings = {t: np.asarray(ids) for t, ids in history.postings.items()}
+    for token, ids in added.postings.items():
+        postings[token] = np.concatenate([postings.get(token, ids[:0]), ids + n])
+    return HistoryIndex(
+        index=index,
+        vectors=vectors,
+        texts=list(history.texts) + added.texts,
+        sources=list(history.sources) + added.sources,
+        destinations=list(history.destinations) + added.destinations,
+        created_at=np.concatenate([history.created_at, added.created_at]),
+        distance_km=np.concatenate([history.distance_km, added.distance_km]),
+        row_ids=np.concatenate([history.row_ids, added.row_ids]),
+        postings=postings,
+    )
+
+
+def _warmup_keys(user_id: int) -> Tuple[str, str]:
+    return f"history_rag_warmup:{user_id}", f"history_rag_dirty:{user_id}"
+
+
+# Delete the lock only while it still holds our token: a build that outlived
+# WARMUP_LOCK_TTL must not release a lock another worker has taken since
+_release_lock_script = redis_client.register_script(
+    "if redis.call('get', KEYS[1]) == ARGV[1] then "
+    "return redis.call('del', KEYS[1]) else return 0 end"
+)
+
+
+def _acquire_warmup_lock(user_id: int) -> Optional[str]:
+    """Take the per-user index build lock; returns its token, or None if held."""
+    lock_key, _ = _warmup_keys(user_id)
+    token = uuid.uuid4().hex
+    if redis_client.set(lock_key, token, nx=True, ex=WARMUP_LOCK_TTL):
+        return token
+    return None
+
+
+def _release_warmup_lock(user_id: int, token: str) -> None:
+    """Release the build lock; on failure it simply expires after WARMUP_LOCK_TTL."""
+    lock_key, _ = _warmup_keys(user_id)
+    try:
+        _release_lock_script(keys=[lock_key], args=[token])
+    except Exception as e:
+        logger.warning(f"Failed to release index warmup lock for user {user_id}: {e}")
+
+
+def _rebuild_until_clean(db: Session, user_id: int) -> Optional[HistoryIndex]:
+    """
+    Rebuild under the lock; triggers that arrived mid-build set the dirty
+    flag, so rebuild once more to include the latest rows.
+    """
+    _, dirty_key = _warmup_keys(user_id)
+    while True:
+        redis_client.delete(dirty_key)
+        history = refresh_history_index(db, user_id)
+        if not redis_client.delete(dirty_key):
+            return history
+
+
+def warm_history_index(
+    user_id: int,
+    only_if_missing: bool = False,
+    new_rows: Optional[List[RouteRow]] = None
+) -> None:
+    """
+    Background job that (re)builds a user's retrieval index ahead of the
+    first insights question.
+
+    A Redis lock makes concurrent triggers for one user (across requests and
+    workers) run a single build; triggers that arrive mid-build set a dirty
+    flag so the running job rebuilds once more to include the latest rows.
+    When the triggering rows are given, only those rows are embedded and
+    appended to the cached index (see append_to_index).
+
+    Args:
+        user_id (int): User whose index to build.
+        only_if_missing (bool): Skip if an index is already cached (login).
+        new_rows (Optional[List[RouteRow]]): Rows just added to the history.
+    """
+    if only_if_missing and redis_client.exists(history_index_key(user_id)):
+        return
+
+    token = _acquire_warmup_lock(user_id)
+    if token is None:
+        _, dirty_key = _warmup_keys(user_id)
+        redis_client.set(dirty_key, 1, ex=WARMUP_LOCK_TTL)
+        return
+
+    db = SessionLocal()
+    try:
+        with track_stage("index_warmup"):
+            history = load_cached_history_index(user_id) if new_rows else None
+            extended = append_to_index(history, new_rows) if history is not None else None
+            if extended is None:
+                _rebuild_until_clean(db, user_id)
+            elif extended is not history:
+                store_history_index(user_id, extended)
+                # A trigger during the append may have added other rows
+                if redis_client.delete(_warmup_keys(user_id)[1]):
+                    _rebuild_until_clean(db, user_id)
+    except Exception as e:
+        logger.exception(f"History index warmup failed for user {user_id}: {e}")
+        # The cached index may now miss rows; rebuild it on next use
+        try:
+            drop_history_index(user_id)
+        except Exception as e:
+            logger.warning(f"Failed to drop stale history index for user {user_id}: {e}")
+    finally:
+        db.close()
+        _release_warmup_lock(user_id, token)
+
+
+def get_history_index(db: Session, user_id: int) -> Optional[HistoryIndex]:
+    """
+    Return the user's cached retrieval index, building it on a miss.
+
+    When a warmup build is already running (e.g. right after login), wait
+    up to WARMUP_WAIT_TIMEOUT for it instead of building the same index
+    concurrently.
+
+    Returns:
+        Optional[HistoryIndex]: The index, or None if the user has no history.
+    """
+    history = load_cached_history_index(user_id)
+    if history is not None:
+        return history
+
+    lock_key, _ = _warmup_keys(user_id)
+    deadline = time.monotonic() + WARMUP_WAIT_TIMEOUT
+    while (token := _acquire_warmup_lock(user_id)) is None:
+        if time.monotonic() >= deadline:
+            return refresh_history_index(db, user_id)
+        time.sleep(WARMUP_POLL_INTERVAL)
+        if not redis_client.exists(lock_key):
+            history = load_cached_history_index(user_id)
+            if history is not None:
+                return history
+
+    try:
+        # A build may have finished between the miss and taking the lock
+        history = load_cached_history_index(user_id)
+        if history is None:
+            history = _rebuild_until_clean(db, user_id)
+        return history
+    finally:
+        _release_warmup_lock(user_id, token)
+
+
 def call_llm(prompt: str) -> str:
     """Call the LLM to answer a question. 
     Returns fallback string on failure."""
     
     llm = ChatGroq(
         api_key=settings.groq_api_key,
+        base_url=settings.groq_base_url,
         model="llama-3.3-70b-versatile",
         temperature=0.1,
         max_tokens=1024
     )
 
     messages = [
-        SystemMessage(
-            content=(
-                "You are a route history assistant. "
-                "Answer only from provided data. "
-                "Do not hallucinate. "
-                "If answer not found, say you don't know."
-            )
-        ),
+        SystemMessage(content=SYSTEM_PROMPT),
         HumanMessage(content=prompt)
     ]
 
     try:
-        resp = llm.invoke(messages)
+        with track_upstream("llm"):
+            resp = llm.invoke(messages)
         return resp.content.strip()
     
     except Exception as e:
@@ -0,0 +1,113 @@
+"""
+Recall/latency benchmark of the history RAG vector index.
+
+Builds the approximate indexes chosen by ``build_vector_index`` on
+synthetic clustered, normalized vectors and compares them to the exact
+flat baseline: recall@k, per-query latency and build time across
+``efSearch`` / ``nprobe`` settings.
+
+Usage (from ``backend/``):
+    python -m benchmarks.ann --sizes 10000 100000
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+DIM = 384
+
+
+def synthetic_vectors(n: int, rng: np.random.Generator, centers: np.ndarray) -> np.ndarray:
+    """Clustered vectors resembling sentence embeddings of similar route texts."""
+    labels = rng.integers(0, len(centers), size=n)
+    vectors = centers[labels] + rng.normal(scale=0.35, size=(n, DIM))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def time_queries(index, queries: np.ndarray, k: int, params=None):
+    """Search one query at a time, as the endpoint does."""
+    results = np.empty((len(queries), k), dtype=np.int64)
+    start = time.perf_counter()
+    for i, q in enumerate(queries):
+        _, ids = index.search(q[None, :], k, params=params)
+        results[i] = ids[0]
+    per_query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    return results, per_query_ms
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def bench_size(n: int, k: int, n_queries: int, seed: int) -> Dict:
+    from app.config import settings
+    from app.service import build_vector_index, search_parameters
+
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(256, DIM))
+    vectors = synthetic_vectors(n, rng, centers)
+    queries = synthetic_vectors(n_queries, rng, centers)
+
+    settings.rag_flat_max_rows = n
+    start = time.perf_counter()
+    flat = build_vector_index(vectors)
+    flat_build_ms = (time.perf_counter() - start) * 1000
+    truth, flat_ms = time_queries(flat, queries, k)
+    report = {"flat": {"build_ms": round(flat_build_ms, 1), "query_ms": round(flat_ms, 3), "recall": 1.0}}
+
+    settings.rag_flat_max_rows = 0
+    for kind, knob, label, values in (
+        ("hnsw", "rag_hnsw_ef_search", "efSearch", (16, 32, 64, 128)),
+        ("ivf", "rag_ivf_nprobe", "nprobe", (1, 4, 16, 64)),
+    ):
+        settings.rag_ann_index = kind
+        start = time.perf_counter()
+        index = build_vector_index(vectors)
+        build_ms = (time.perf_counter() - start) * 1000
+        for value in values:
+            setattr(settings, knob, value)
+            found, query_ms = time_queries(index, queries, k, search_parameters(index))
+            report[f"{kind}_{label}={value}"] = {
+                "build_ms": round(build_ms, 1),
+                "query_ms": round(query_ms, 3),
+                "recall": round(recall(found, truth), 4),
+            }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+    os.environ.setdefault("GROQ_API_KEY", "bench-key")
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+    report = {"meta": {"timestamp": datetime.utcnow().isoformat(), "k": args.k}, "sizes": {}}
+    for n in args.sizes:
+        report["sizes"][str(n)] = bench_size(n, args.k, args.queries, args.seed)
+        for variant, stats in report["sizes"][str(n)].items():
+            print(f"n={n:<8} {variant:<18} {stats}")
+
+    output = args.output or RESULTS_DIR / f"ann-{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Compare two benchmark result files produced by ``run.py``.
+
+Usage (from ``backend/``):
+    python -m benchmarks.compare results/base.json results/new.json
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+LOAD_METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def _delta(old: float, new: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    args = parser.parse_args()
+
+    base = json.loads(args.baseline.read_text())
+    new = json.loads(args.candidate.read_text())
+    print(f"baseline {base['meta']['revision']}  vs  candidate {new['meta']['revision']}\n")
+
+    for scenario, levels in new.get("load", {}).items():
+        for level, stats in levels.items():
+            old_stats = base.get("load", {}).get(scenario, {}).get(level)
+            if not old_stats:
+                continue
+            cells = "  ".join(
+                f"{m}={stats[m]} ({_delta(old_stats[m], stats[m])})" for m in LOAD_METRICS
+            )
+            print(f"{scenario:<14} c={level:<3} {cells}")
+
+    for name, stats in new.get("micro", {}).items():
+        old_stats = base.get("micro", {}).get(name)
+        if not old_stats:
+            continue
+        cells = "  ".join(
+            f"{m}={v} ({_delta(old_stats.get(m, 0), v)})" for m, v in stats.items()
+        )
+        print(f"{name:<20} {cells}")
+
+
+if __name__ == "__main__":
+    main()
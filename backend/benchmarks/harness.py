@@ -0,0 +1,112 @@
+"""
+Boot the FastAPI app in-process against local stand-ins and seed data.
+
+Settings are read from the environment when ``app`` is first imported, so
+``configure_environment`` must run before anything from ``app`` is imported.
+"""
+
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+def configure_environment(database_url: str, stub_url: str, redis_mode: str) -> None:
+    """Point the app at the stand-ins and swap in fakeredis if requested."""
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["NOMINATIM_URL"] = stub_url
+    os.environ["GROQ_BASE_URL"] = stub_url.rstrip("/")
+    os.environ["THROTTLE_ENABLED"] = "false"
+    os.environ["DEBUG"] = "false"
+    os.environ.setdefault("GROQ_API_KEY", "bench-key")
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+    if redis_mode == "fake":
+        import fakeredis
+        from app import config
+
+        # Must happen before other app modules bind redis_client by name.
+        config.redis_client = fakeredis.FakeRedis()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app():
+    """
+    Run the app under uvicorn on a background thread.
+    Returns:
+        Tuple[uvicorn.Server, str]: Server and its base URL.
+    """
+    import uvicorn
+    from app.database import Base, engine
+    from app.main import app
+
+    Base.metadata.create_all(engine)
+
+    port = _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def seed_user(history_rows: int):
+    """
+    Create a fresh benchmark user with synthetic history.
+    Returns:
+        Tuple[int, str]: User id and bearer token.
+    """
+    from sqlalchemy import insert
+
+    from app.auth import create_access_token, hash_password
+    from app.constants import KM_TO_MILES
+    from app.database import SessionLocal
+    from app.models import History, User
+    from app.service import haversine_distance, record_route_stats, route_location_columns
+    from benchmarks.stubs import fake_coordinates
+
+    db = SessionLocal()
+    try:
+        user = User(
+            email=f"bench-{time.time_ns()}@example.com",
+            first_name="Bench",
+            last_name="User",
+            password=hash_password("benchmark"),
+        )
+        db.add(user)
+        db.commit()
+
+        cities = [f"Bench City {n}" for n in range(200)]
+        start = datetime.utcnow() - timedelta(days=365)
+        batch = []
+        for i in range(history_rows):
+            source = cities[i % len(cities)]
+            destination = cities[(i * 7 + 3) % len(cities)]
+            src, dst = fake_coordinates(source), fake_coordinates(destination)
+            km = haversine_distance(*src, *dst)
+            batch.append({
+                "source": source,
+                "destination": destination,
+                "kilometer_distance": round(km, 2),
+                "mile_distance": round(km * KM_TO_MILES, 2),
+                "user_id": user.id,
+                "created_at": start + timedelta(minutes=i * 37),
+                **route_location_columns(src, dst),
+            })
+            if len(batch) == 1000 or i == history_rows - 1:
+                db.execute(insert(History), batch)
+                record_route_stats(db, user.id, batch)
+                db.commit()
+                batch = []
+
+        return user.id, create_access_token({"user_id": user.id})
+    finally:
+        db.close()
@@ -0,0 +1,253 @@
+"""
+Benchmark and load-test runner.
+
+Boots the app against local stand-ins (see ``stubs.py``), drives the main
+endpoints at several concurrency levels, runs micro-benchmarks of the hot
+service functions, and writes everything to a JSON file for comparison
+across commits (see ``compare.py``).
+
+Usage (from ``backend/``):
+    python -m benchmarks.run --concurrency 1 4 16 --requests 200
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import random
+import subprocess
+import time
+import timeit
+import uuid
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+from benchmarks.harness import configure_environment, seed_user, start_app
+from benchmarks.stubs import start_stub_server
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int) -> Dict:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+async def run_load(send: Callable, total: int, concurrency: int) -> Dict:
+    """Issue `total` requests from `concurrency` workers and time each one."""
+    import httpx
+
+    counter = itertools.count()
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker(client):
+        nonlocal errors
+        while (i := next(counter)) < total:
+            start = time.perf_counter()
+            try:
+                response = await send(client, i)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return summarize(latencies, elapsed, errors)
+
+
+def build_scenarios(base_url: str, user_id: int, token: str, history_rows: int) -> Dict[str, Callable]:
+    from app.config import redis_client
+    from app.service import history_index_key
+
+    headers = {"Authorization": f"Bearer {token}"}
+    run_tag = uuid.uuid4().hex[:8]
+
+    async def distance(client, i):
+        # Half the addresses repeat, so both geo cache hits and misses occur.
+        return await client.post(
+            f"{base_url}/routes/distance",
+            json={
+                "source": f"Bench {run_tag} {i % 50}",
+                "destination": f"Bench {run_tag} {i}",
+                "unit": "both",
+            },
+            headers=headers,
+        )
+
+    async def history(client, i):
+        offset = random.randrange(0, max(1, history_rows - 100))
+        return await client.get(
+            f"{base_url}/routes/history",
+            params={"offset": offset, "limit": 100},
+            headers=headers,
+        )
+
+    async def insights_cold(client, i):
+        # Drop the prebuilt index so the request pays the full build path.
+        redis_client.delete(history_index_key(user_id))
+        return await client.post(
+            f"{base_url}/routes/history-insights",
+            json={"question": "Where do I travel most?", "session_id": f"cold-{run_tag}-{i}"},
+            headers=headers,
+        )
+
+    async def insights_warm(client, i):
+        return await client.post(
+            f"{base_url}/routes/history-insights",
+            json={"question": "What was my longest route?", "session_id": f"warm-{run_tag}"},
+            headers=headers,
+        )
+
+    return {
+        "distance": distance,
+        "history": history,
+        "insights_cold": insights_cold,
+        "insights_warm": insights_warm,
+    }
+
+
+def run_micro(index_sizes: List[int]) -> Dict:
+    """Micro-benchmarks of haversine_distance, build_user_index and search_history."""
+    from app.service import build_user_index, haversine_distance, search_history
+
+    results: Dict = {}
+
+    number = 200_000
+    seconds = timeit.timeit(
+        lambda: haversine_distance(28.6139, 77.2090, 52.542, 13.366), number=number
+    )
+    results["haversine_distance"] = {"ns_per_call": round(seconds / number * 1e9, 1)}
+
+    for size in index_sizes:
+        rows = [
+            SimpleNamespace(
+                id=i,
+                source=f"City {i % 97}",
+                destination=f"City {(i * 7) % 89}",
+                kilometer_distance=float(i % 1500),
+                created_at=datetime(2026, 1, 1),
+            )
+            for i in range(size)
+        ]
+        start = time.perf_counter()
+        history = build_user_index(rows)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        queries = 50
+        start = time.perf_counter()
+        for _ in range(queries):
+            search_history("Which trips went to City 5?", history, k=5)
+        search_ms = (time.perf_counter() - start) * 1000 / queries
+
+        results[f"index_{size}"] = {
+            "build_user_index_ms": round(build_ms, 2),
+            "search_history_ms": round(search_ms, 3),
+        }
+
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./bench.db")
+    parser.add_argument("--redis", choices=["fake", "local"], default="fake",
+                        help="fakeredis in-process, or the Redis configured via REDIS_HOST/REDIS_PORT")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and level")
+    parser.add_argument("--history-rows", type=int, default=2000)
+    parser.add_argument("--scenarios", nargs="+",
+                        default=["distance", "history", "insights_cold", "insights_warm"])
+    parser.add_argument("--nominatim-latency-ms", type=float, default=50)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--index-sizes", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--output", type=Path, help="Result file (default: results/<rev>-<timestamp>.json)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    _, stub_url = start_stub_server(
+        nominatim_latency=args.nominatim_latency_ms / 1000,
+        llm_latency=args.llm_latency_ms / 1000,
+    )
+    configure_environment(args.database_url, stub_url, args.redis)
+
+    revision = git_revision()
+    report: Dict = {
+        "meta": {
+            "revision": revision,
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        },
+        "load": {},
+        "micro": {},
+    }
+
+    if not args.skip_load:
+        _, base_url = start_app()
+        user_id, token = seed_user(args.history_rows)
+        scenarios = build_scenarios(base_url, user_id, token, args.history_rows)
+        for name in args.scenarios:
+            report["load"][name] = {}
+            for level in args.concurrency:
+                stats = asyncio.run(run_load(scenarios[name], args.requests, level))
+                report["load"][name][str(level)] = stats
+                print(
+                    f"{name:<14} c={level:<3} {stats['throughput_rps']:>8} rps  "
+                    f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms "
+                    f"p99={stats['p99_ms']}ms errors={stats['errors']}"
+                )
+
+    if not args.skip_micro:
+        report["micro"] = run_micro(args.index_sizes)
+        for name, stats in report["micro"].items():
+            print(f"{name:<20} {stats}")
+
+    output = args.output or RESULTS_DIR / f"{revision}-{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Local stand-ins for the external services the backend calls.
+
+A single threaded HTTP server answers both Nominatim ``/search`` and the
+Groq (OpenAI-compatible) chat completions endpoint, with configurable
+artificial latency so upstream cost can be modelled.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def fake_coordinates(address: str):
+    """Deterministic pseudo-coordinates for an address."""
+    digest = int(hashlib.sha1(address.lower().encode("utf-8")).hexdigest(), 16)
+    lat = (digest % 17000) / 100 - 85
+    lon = ((digest // 17000) % 36000) / 100 - 180
+    return round(lat, 5), round(lon, 5)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    nominatim_latency = 0.0
+    llm_latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.endswith("/search"):
+            self.send_error(404)
+            return
+
+        address = parse_qs(url.query).get("q", [""])[0]
+        time.sleep(self.nominatim_latency)
+        lat, lon = fake_coordinates(address)
+        self._send_json([{"lat": str(lat), "lon": str(lon), "display_name": address}])
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        prompt_chars = sum(len(m.get("content", "")) for m in request.get("messages", []))
+        time.sleep(self.llm_latency)
+        self._send_json({
+            "id": "bench-completion",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "bench"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "Benchmark answer."},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_chars // 4,
+                "completion_tokens": 3,
+                "total_tokens": prompt_chars // 4 + 3,
+            },
+        })
+
+
+def start_stub_server(nominatim_latency: float = 0.0, llm_latency: float = 0.0):
+    """
+    Start the stub server on a free local port.
+    Returns:
+        Tuple[ThreadingHTTPServer, str]: Server and its base URL.
+    """
+    handler = type("StubHandler", (_StubHandler,), {
+        "nominatim_latency": nominatim_latency,
+        "llm_latency": llm_latency,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/"
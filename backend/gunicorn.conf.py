@@ -0,0 +1,65 @@
+"""
+Gunicorn configuration for the production server.
+
+Runs the FastAPI app under uvicorn workers. The app (settings, DB engine,
+SentenceTransformer model) is imported once in the master with
+``preload_app`` and shared copy-on-write by the forked workers.
+
+All knobs can be overridden through environment variables.
+"""
+
+import gc
+import multiprocessing
+import os
+import shutil
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", cpu_count))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+# Recycle workers periodically to bound memory growth; jitter avoids
+# all workers restarting at once.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# Insights requests can spend several seconds building an index or
+# waiting on the LLM.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+# Prometheus multiprocess mode: must be set before prometheus_client is
+# imported by the preloaded app.
+prometheus_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc"
+)
+shutil.rmtree(prometheus_dir, ignore_errors=True)
+os.makedirs(prometheus_dir, exist_ok=True)
+
+
+def pre_fork(server, worker):
+    # Move preloaded objects to a permanent generation so the cyclic GC in
+    # workers does not touch (and un-share) their pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared across processes.
+    from app.database import engine
+    engine.dispose(close=False)
+
+    # Split CPU between workers instead of every worker's torch using all cores.
+    import torch
+    torch.set_num_threads(max(1, cpu_count // workers))
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,49 @@
+import math
+import random
+
+import pytest
+
+from app import geohash
+from app.constants import EARTH_RADIUS_KM
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _destination(lat, lon, bearing, km):
+    lat, lon, d = math.radians(lat), math.radians(lon), km / EARTH_RADIUS_KM
+    lat2 = math.asin(
+        math.sin(lat) * math.cos(d) + math.cos(lat) * math.sin(d) * math.cos(bearing)
+    )
+    lon2 = lon + math.atan2(
+        math.sin(bearing) * math.sin(d) * math.cos(lat),
+        math.cos(d) - math.sin(lat) * math.sin(lat2),
+    )
+    return math.degrees(lat2), (math.degrees(lon2) + 180) % 360 - 180
+
+
+def test_km_per_degree_matches_haversine():
+    assert geohash.KM_PER_DEGREE == pytest.approx(_haversine(0, 0, 1, 0))
+
+
+def test_coverage_holds_at_the_edge_of_the_radius():
+    rng = random.Random(7)
+    for _ in range(20_000):
+        lat, lon = rng.uniform(-89, 89), rng.uniform(-180, 180)
+        precision = rng.randint(2, 7)
+        radius = geohash.coverage_km(precision, lat)
+        point = _destination(
+            lat, lon, rng.uniform(0, 2 * math.pi), radius * rng.uniform(0.995, 1.0)
+        )
+        assert _haversine(lat, lon, *point) <= radius + 1e-9
+        assert geohash.encode(*point, precision) in geohash.neighbourhood(lat, lon, precision)
+
+
+def test_no_precision_covers_a_radius_around_the_pole():
+    assert geohash.precision_for_radius(500, 89.9, 9) == 0
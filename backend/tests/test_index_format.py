@@ -0,0 +1,99 @@
+import faiss
+import numpy as np
+import pytest
+
+from app import index_format
+from app.index_format import content_id, decode_history_index, encode_history_index
+from app.retrieval import HistoryIndex
+
+DIM = 8
+
+
+def _history(index=None, rows=4):
+    rng = np.random.default_rng(0)
+    vectors = rng.random((rows, DIM), dtype=np.float32)
+    if index is not None:
+        index.add(vectors)
+        vectors = vectors[:0]
+    return HistoryIndex(
+        index=index,
+        vectors=vectors,
+        texts=[f"Route {i} to Zürich" for i in range(rows)],
+        sources=["München", "", "Köln", "Berlin"][:rows],
+        destinations=["Zürich"] * rows,
+        created_at=np.array(
+            ["2026-01-01T10:00:00", "NaT", "2025-12-31T23:59:59", "2026-02-01"][:rows],
+            dtype="datetime64[s]",
+        ),
+        distance_km=np.array([12.5, np.nan, 0.0, 600.25][:rows], dtype=np.float32),
+        row_ids=np.array([11, 12, 40, 7][:rows], dtype=np.int64),
+        postings={
+            "zürich": np.arange(rows),
+            "münchen": np.array([0]),
+            "köln": np.array([2]),
+            "berlin": np.array([3]),
+        },
+    )
+
+
+def test_round_trip_exact_index():
+    history = _history()
+    decoded = decode_history_index(encode_history_index(history))
+
+    assert decoded.index is None
+    np.testing.assert_array_equal(decoded.vectors, history.vectors)
+    assert list(decoded.texts) == history.texts
+    assert list(decoded.sources) == history.sources
+    assert decoded.destinations[-1] == "Zürich"
+    assert decoded.sources[1:3] == ["", "Köln"]
+    np.testing.assert_array_equal(decoded.created_at, history.created_at)
+    assert np.isnat(decoded.created_at[1])
+    np.testing.assert_array_equal(decoded.distance_km, history.distance_km)
+    assert np.isnan(decoded.distance_km[1])
+    np.testing.assert_array_equal(decoded.row_ids, history.row_ids)
+    assert decoded.record(1) == {
+        "source": "", "destination": "Zürich", "distance_km": None, "created_at": None
+    }
+
+
+def test_postings_lookup():
+    decoded = decode_history_index(encode_history_index(_history()))
+
+    assert sorted(decoded.postings) == ["berlin", "köln", "münchen", "zürich"]
+    assert decoded.postings["köln"].tolist() == [2]
+    assert decoded.postings["zürich"].tolist() == [0, 1, 2, 3]
+    assert "paris" not in decoded.postings
+    with pytest.raises(KeyError):
+        decoded.postings["aachen"]
+
+
+def test_round_trip_ann_index_is_cached_by_content_id():
+    index_format._ann_cache.clear()
+    index_format._ann_cache_bytes = 0
+    history = _history(faiss.IndexHNSWFlat(DIM, 8, faiss.METRIC_INNER_PRODUCT))
+    blob = encode_history_index(history)
+
+    decoded = decode_history_index(blob)
+    assert decoded.vectors.shape == (0, DIM)
+    assert decoded.index.ntotal == history.index.ntotal
+    query = np.random.default_rng(1).random((1, DIM), dtype=np.float32)
+    assert decoded.index.search(query, 4)[1].tolist() == history.index.search(query, 4)[1].tolist()
+
+    assert decode_history_index(blob).index is decoded.index
+    assert list(index_format._ann_cache) == [content_id(blob)]
+
+
+def test_content_id_depends_on_content():
+    assert content_id(encode_history_index(_history(rows=3))) != content_id(
+        encode_history_index(_history(rows=4))
+    )
+
+
+def test_rejects_truncated_or_foreign_blobs():
+    blob = encode_history_index(_history())
+    with pytest.raises(ValueError):
+        decode_history_index(blob[:10])
+    with pytest.raises(ValueError):
+        decode_history_index(blob[:-8])
+    with pytest.raises(ValueError):
+        decode_history_index(b"XXXX" + blob[4:])
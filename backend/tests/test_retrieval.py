@@ -0,0 +1,116 @@
+from datetime import datetime
+
+import faiss
+import numpy as np
+import pytest
+
+from app.retrieval import (
+    HistoryIndex, dense_ranking, exact_ranking, parse_question_filters, tokenize
+)
+
+NOW = datetime(2026, 10, 19, 12, 30)
+
+
+@pytest.mark.parametrize("question, month", [
+    ("routes in March", 3),
+    ("trips during sept.", 9),
+    ("what did I drive in dec", 12),
+    ("longest route of August", 8),
+])
+def test_month_without_year(question, month):
+    filters = parse_question_filters(question, NOW)
+    assert filters.month == month
+    assert filters.start is None and filters.end is None
+
+
+def test_month_with_year():
+    filters = parse_question_filters("routes in Dec 2025", NOW)
+    assert filters.start == datetime(2025, 12, 1)
+    assert filters.end == datetime(2026, 1, 1)
+    assert filters.month is None
+
+
+@pytest.mark.parametrize("question", [
+    "trips in Marseille",
+    "routes in Mayfair",
+    "routes in Decatur",
+    "routes of Junction City",
+])
+def test_place_names_are_not_months(question):
+    assert not parse_question_filters(question, NOW).active
+
+
+def test_place_name_does_not_hide_relative_date():
+    filters = parse_question_filters("routes in Augsburg last year", NOW)
+    assert filters.month is None
+    assert filters.start == datetime(2025, 10, 19, 12, 30)
+
+
+def test_year():
+    filters = parse_question_filters("trips in 2024", NOW)
+    assert (filters.start, filters.end) == (datetime(2024, 1, 1), datetime(2025, 1, 1))
+
+
+def test_relative_and_named_days():
+    assert parse_question_filters("last 2 weeks", NOW).start == datetime(2026, 10, 5, 12, 30)
+    yesterday = parse_question_filters("where did I go yesterday", NOW)
+    assert (yesterday.start, yesterday.end) == (datetime(2026, 10, 18), datetime(2026, 10, 19))
+
+
+def test_distance_bounds():
+    filters = parse_question_filters("routes longer than 100 km but under 62.1371 miles", NOW)
+    assert filters.min_km == 100
+    assert filters.max_km == pytest.approx(100, rel=1e-4)
+
+
+def test_no_filters():
+    assert not parse_question_filters("how often do I go to Berlin", NOW).active
+
+
+def test_tokenize_keeps_non_ascii_place_names():
+    assert tokenize("München to Zürich") == ["münchen", "zürich"]
+
+
+def test_tokenize_drops_stopwords_and_single_characters():
+    assert tokenize("Routes from A to the Berlin Hbf 2") == ["berlin", "hbf"]
+
+
+def _clustered_hnsw(rows=10_000, dim=32, clusters=50, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(clusters, size=rows)] + 0.1 * rng.normal(size=(rows, dim))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    index = faiss.IndexHNSWFlat(dim, 16, faiss.METRIC_INNER_PRODUCT)
+    index.add(vectors)
+    history = HistoryIndex(
+        index=index, vectors=vectors[:0], texts=[""] * rows, sources=[], destinations=[],
+        created_at=np.empty(0, dtype="datetime64[s]"), distance_km=np.empty(0, dtype=np.float32),
+        row_ids=np.arange(rows),
+    )
+    return history, vectors, rng
+
+
+@pytest.mark.parametrize("selected", [10, 50, 200])
+def test_selective_filter_on_hnsw_is_exact(selected):
+    history, vectors, rng = _clustered_hnsw()
+    mask = np.zeros(len(vectors), dtype=bool)
+    mask[rng.choice(len(vectors), selected, replace=False)] = True
+    query = vectors[:1]
+
+    ranking = dense_ranking(
+        history, query, mask, 20, faiss.SearchParametersHNSW(efSearch=16),
+        exact_max_rows=500,
+    )
+    assert ranking == exact_ranking(vectors, query[0], mask, 20)
+
+
+def test_wide_filter_on_hnsw_fills_the_limit():
+    history, vectors, rng = _clustered_hnsw()
+    mask = rng.random(len(vectors)) < 0.1
+
+    ranking = dense_ranking(
+        history, vectors[:1], mask, 20, faiss.SearchParametersHNSW(efSearch=16),
+        exact_max_rows=500,
+    )
+    assert len(ranking) == 20
+    assert mask[ranking].all()